@@ -0,0 +1,69 @@
+"""Peak memory and throughput of K.dump/K.load_stream versus -8!/-9!
+
+Run with the pyq launcher:
+
+    pyq benchmarks/bench_dump.py [rows]
+
+Each mode runs in a forked child, so the peak RSS it reports does not
+include the memory used by the other modes.
+"""
+from __future__ import print_function
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from pyq import q, K
+
+MODES = ['-8!', 'dump', 'dump compressed']
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run(mode, rows, path):
+    x = q('{([]a:til x;b:x?1f;c:x?`3;d:x?100i)}', rows)
+    size = int(q('-22!', x)) / 1e6
+    base = peak_mb()
+    start = time.time()
+    with open(path, 'wb') as f:
+        if mode == '-8!':
+            f.write(memoryview(K._b9(1, x)))
+        else:
+            x.dump(f, compress=mode.endswith('compressed'))
+    written = time.time()
+    with open(path, 'rb') as f:
+        if mode == '-8!':
+            y = K._d9(K._kp(f.read()))
+        else:
+            y = K.load_stream(f)
+    loaded = time.time()
+    assert y == x
+    print("%-16s %8.1f MB/s write %8.1f MB/s read %8.1f MB peak "
+          "above table %8.1f MB on disk" % (
+              mode, size / (written - start), size / (loaded - written),
+              peak_mb() - base, os.path.getsize(path) / 1e6))
+
+
+def main(rows):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        for mode in MODES:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    run(mode, rows, path)
+                finally:
+                    sys.stdout.flush()
+                    os._exit(0)
+            os.waitpid(pid, 0)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
@@ -0,0 +1,77 @@
+"""Peak memory of pyq.ipc.fetch versus a single remote call
+
+A second q process holds a table of the given number of rows (16 bytes
+per row, so the default is about 1 GB).  The table is pulled to the
+client in one message, with fetch, and with fetch compressing the
+chunks.  Run with the pyq launcher:
+
+    pyq benchmarks/bench_fetch.py [rows [chunk_rows]]
+
+QBIN names the q executable (default: q).  Each mode uses a fresh
+server and a forked client, so the peak figures are per mode.
+"""
+from __future__ import print_function
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from pyq import kp
+from pyq.ipc import fetch, hopen, hclose
+
+SERVER = 'p:1024;while[0~@[system;"p ",string p;0];p+:1];-1 string p;'
+MODES = ['single call', 'fetch', 'fetch compressed']
+
+
+def start_server(rows):
+    process = subprocess.Popen([os.getenv('QBIN', 'q'), '-q'],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    code = SERVER + 't:([]a:til %d;b:%d?1f);' % (rows, rows)
+    process.stdin.write(code.encode() + b'\n')
+    process.stdin.flush()
+    return process, int(process.stdout.readline())
+
+
+def run(mode, port, chunk_rows):
+    h = hopen(port)
+    try:
+        start = time.time()
+        if mode == 'single call':
+            n = len(h(kp('t')))
+        else:
+            n = 0
+            for chunk in fetch(h, 't', chunk_rows=chunk_rows,
+                               compress=mode.endswith('compressed')):
+                n += len(chunk)
+        elapsed = time.time() - start
+        server = int(h(kp('.Q.w[]`peak'))) / 2. ** 20
+    finally:
+        hclose(h)
+    client = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+    print("%-16s %10d rows %8.2f s  client peak RSS %8.1f MB  "
+          "server peak heap %8.1f MB" % (mode, n, elapsed, client, server))
+
+
+def main(rows, chunk_rows):
+    for mode in MODES:
+        process, port = start_server(rows)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    run(mode, port, chunk_rows)
+                finally:
+                    sys.stdout.flush()
+                    os._exit(0)
+            os.waitpid(pid, 0)
+        finally:
+            process.stdin.close()
+            process.wait()
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args + [64000000, 100000][len(args):])
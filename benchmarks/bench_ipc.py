@@ -0,0 +1,64 @@
+"""Cost of a remote call through pyq.ipc.ConnectionPool
+
+Compares opening a new connection for every call, which is what the
+%%q -h magic used to do, with reusing pooled connections.  A second q
+process is started on localhost.  Run with the pyq launcher:
+
+    pyq benchmarks/bench_ipc.py [calls]
+
+QBIN names the q executable (default: q).
+"""
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+from pyq import kp
+from pyq.ipc import ConnectionPool, hopen, hclose
+
+SERVER = 'p:1024;while[0~@[system;"p ",string p;0];p+:1];-1 string p;'
+
+
+def start_server():
+    process = subprocess.Popen([os.getenv('QBIN', 'q'), '-q'],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    process.stdin.write(SERVER.encode() + b'\n')
+    process.stdin.flush()
+    return process, int(process.stdout.readline())
+
+
+def per_call(f, calls):
+    start = time.time()
+    for _ in range(calls):
+        f()
+    return (time.time() - start) / calls * 1e6
+
+
+def main(calls):
+    process, port = start_server()
+    query = kp('sum til 100')
+    pool = ConnectionPool()
+
+    def fresh():
+        h = hopen(port)
+        try:
+            h(query)
+        finally:
+            hclose(h)
+
+    try:
+        pool.call(port, query)  # open the pooled connection
+        for name, f in [('hopen per call', fresh),
+                        ('ConnectionPool', lambda: pool.call(port, query))]:
+            print("%-16s %8.1f us/call" % (name, per_call(f, calls)))
+    finally:
+        pool.close()
+        process.stdin.close()
+        process.wait()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,65 @@
+"""Throughput of pyq.shm versus pickling K objects between processes
+
+The parent stores a table and a forked child reads it back and sums
+its columns, once through pyq.shm.put/get and once by unpickling
+(K._b9/d9) bytes that the child inherits.  Run with the pyq launcher:
+
+    pyq benchmarks/bench_shm.py [rows]
+"""
+from __future__ import print_function
+
+import os
+import pickle
+import sys
+import time
+
+from pyq import q
+from pyq import shm
+
+_touch = q('{sum each value flip x}')
+
+
+def in_child(read):
+    """Run read() in a forked child and return its wall time"""
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        start = time.time()
+        _touch(read())
+        os.write(w, repr(time.time() - start).encode())
+        os._exit(0)
+    os.close(w)
+    os.waitpid(pid, 0)
+    elapsed = float(os.read(r, 64))
+    os.close(r)
+    return elapsed
+
+
+def via_shm(x):
+    start = time.time()
+    name = shm.put(x)
+    written = time.time() - start
+    try:
+        return written, in_child(lambda: shm.get(name))
+    finally:
+        shm.unlink(name)
+
+
+def via_pickle(x):
+    start = time.time()
+    s = pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+    written = time.time() - start
+    return written, in_child(lambda: pickle.loads(s))
+
+
+def main(rows):
+    x = q('{([]a:til x;b:x?1f;c:x?100i)}', rows)
+    size = int(q('-22!', x)) / 1e6
+    for name, f in [('shm', via_shm), ('pickle', via_pickle)]:
+        put, get = f(x)
+        print("%-8s put %8.1f MB/s  get in another process %8.1f MB/s" % (
+            name, size / put, size / get))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000000)
@@ -104,7 +104,8 @@ METADATA = dict(
              'src/scripts/ipyq',
              'src/scripts/pq',
              'src/scripts/qp',
-             ],
+             ] + (['src/scripts/pyq-fork']
+                  if sys.version_info >= (3, 5) else []),
     data_files=[
         ('q', ['src/pyq/p.k',
                'src/pyq/pyq-operators.q',
@@ -326,6 +327,14 @@ python_dll:"{python_dll}\\000"
 pyq_executable:"{pyq_executable}"
 """
 
+# Serializes the definitions in pyq-operators.q (see pyq._load_operators)
+# The blob is (md5 hex digest of the script; definitions in .p).
+OPERATORS_BLOB_Q = """\
+\\l {script}
+(hsym`$"{blob}")1:-8!(`$raze string md5"c"$read1 hsym`$"{script}";1_.p)
+\\\\
+"""
+
 
 class BuildQLib(Command):
     description = "build q/k scripts"
@@ -336,6 +345,7 @@ class BuildQLib(Command):
     ]
 
     q_home = None
+    q_arch = None
     build_base = None
     build_lib = None
 
@@ -348,6 +358,7 @@ class BuildQLib(Command):
     def finalize_options(self):
         self.set_undefined_options('config',
                                    ('q_home', 'q_home'),
+                                   ('q_arch', 'q_arch'),
                                    ('python_dll', 'python_dll'))
         self.set_undefined_options('build',
                                    ('build_base', 'build_base'))
@@ -363,6 +374,31 @@ class BuildQLib(Command):
             script_file = os.path.join('src', 'pyq', script)
             self.write_pyq_config()
             self.copy_file(script_file, outfile, preserve_mode=0)
+        self.write_operators_blob()
+
+    def write_operators_blob(self):
+        """Serialize pyq-operators.q so that pyq can load it with -9!
+
+        The blob is optional: pyq loads the script if it is missing.
+        """
+        blob = os.path.join(self.build_lib, 'pyq-operators.qb')
+        script = os.path.join(self.build_lib, 'pyq-operators.q')
+        code = OPERATORS_BLOB_Q.format(script=script.replace('\\', '/'),
+                                       blob=blob.replace('\\', '/'))
+        q_exe = os.path.join(self.q_home, self.q_arch, 'q')
+        self.announce('writing %s' % blob, 2)
+        try:
+            p = subprocess.Popen([q_exe, '-q'], stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+            output = p.communicate(code.encode())[0]
+        except OSError as e:
+            self.warn("cannot run %s: %s" % (q_exe, e))
+            return
+        if p.returncode or not os.path.exists(blob):
+            self.warn("cannot write %s: %s" % (blob, decode(output)))
+            return
+        add_data_file(self.distribution.data_files, 'q', blob)
 
     def write_pyq_config(self):
         pyq_config_file = os.path.join(self.build_lib, 'pyq-config.q')
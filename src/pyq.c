@@ -13,6 +13,7 @@
 #include <sys/stat.h>
 #include <pwd.h>
 #include <limits.h>
+#include <errno.h>
 #ifdef __APPLE__
 #  include <mach-o/dyld.h>
 #  include <uuid/uuid.h>
@@ -34,6 +35,7 @@ get_progpath(const char *progname)
 }
 #elif defined(__linux__) /* __APPLE__ */
 #include <sched.h>
+#include <sys/syscall.h>
 static char *
 get_progpath(const char *progname)
 {
@@ -85,12 +87,12 @@ get_progpath(const char *progname)
 static cpu_set_t cpu_set;
 
 static int
-parse_cpus(char *cpus)
+parse_cpus(char *cpus, cpu_set_t *set)
 {
     char *str1, *str2, *token, *subtoken;
     char *saveptr1, *saveptr2;
     int i, j, cpu[2];
-    CPU_ZERO(&cpu_set);
+    CPU_ZERO(set);
     for (str1 = cpus; ; str1 = NULL) {
         token = strtok_r(str1, ",", &saveptr1);
         if (token == NULL)
@@ -103,11 +105,11 @@ parse_cpus(char *cpus)
             }
             switch (i) {
             case 1:
-                CPU_SET(cpu[0], &cpu_set);
+                CPU_SET(cpu[0], set);
                 break;
             case 2:
                 for (j = cpu[0]; j <= cpu[1]; j++) {
-                    CPU_SET(j, &cpu_set);
+                    CPU_SET(j, set);
                 }
                 break;
             default:
@@ -133,18 +135,23 @@ static int CPU_COUNT(cpu_set_t *set) {
 #endif /* !CPU_COUNT */
 
 static void
-print_cpus(void)
+print_set(cpu_set_t *set)
 {
-    int i, n;
-    n = CPU_COUNT(&cpu_set);
-    printf("n = %d\n", n);
+    int i;
     for (i = 0; i < CPU_SETSIZE; i++) {
-        if (CPU_ISSET(i, &cpu_set))
+        if (CPU_ISSET(i, set))
             printf("%d ", i);
     }
     printf("\n");
 }
 
+static void
+print_cpus(void)
+{
+    printf("n = %d\n", CPU_COUNT(&cpu_set));
+    print_set(&cpu_set);
+}
+
 static int
 taskset(void)
 {
@@ -152,7 +159,7 @@ taskset(void)
     cpus = getenv("CPUS");
     test_cpus = getenv("TEST_CPUS");
     if (cpus) {
-        parse_cpus(cpus);
+        parse_cpus(cpus, &cpu_set);
         if (test_cpus) {
             print_cpus();
             exit(0);
@@ -166,6 +173,107 @@ taskset(void)
     }
     return 0;
 }
+
+/* Memory policy modes from linux/mempolicy.h */
+#define PYQ_MPOL_DEFAULT 0
+#define PYQ_MPOL_PREFERRED 1
+#define PYQ_MPOL_BIND 2
+#define PYQ_MPOL_INTERLEAVE 3
+#define NODEMASK_LONGS (CPU_SETSIZE / (8 * sizeof(unsigned long)))
+
+static const char *mpol_names[] = {"default", "preferred", "bind",
+                                   "interleave"};
+
+/* PYQ_MEMPOLICY=mode[:nodes] where mode is one of mpol_names and nodes
+   is a list like 0,2-3 (all online nodes by default).  The policy is
+   inherited by q after exec. */
+static int
+mempolicy(void)
+{
+    char *env, *nodes, policy[256], buf[256];
+    unsigned long mask[NODEMASK_LONGS];
+    cpu_set_t node_set;
+    int mode, i;
+    FILE *f;
+    env = getenv("PYQ_MEMPOLICY");
+    if (env == NULL || !*env)
+        return 0;
+    if (strlen(env) >= sizeof(policy)) {
+        fprintf(stderr, "pyq: PYQ_MEMPOLICY is too long\n");
+        return -1;
+    }
+    strcpy(policy, env);
+    nodes = strchr(policy, ':');
+    if (nodes)
+        *nodes++ = '\0';
+    for (mode = 0; mode < 4; mode++) {
+        if (!strcmp(policy, mpol_names[mode]))
+            break;
+    }
+    if (mode == 4) {
+        fprintf(stderr, "pyq: unknown PYQ_MEMPOLICY mode: %s\n", policy);
+        return -1;
+    }
+    if (nodes && mode == PYQ_MPOL_DEFAULT) {
+        fprintf(stderr, "pyq: PYQ_MEMPOLICY mode default takes no nodes\n");
+        return -1;
+    }
+    if (nodes == NULL && mode != PYQ_MPOL_DEFAULT) {
+        f = fopen("/sys/devices/system/node/online", "r");
+        if (f == NULL || !fgets(buf, sizeof(buf), f))
+            strcpy(buf, "0");
+        nodes = strtok(buf, "\n");
+        if (f)
+            fclose(f);
+    }
+    memset(mask, 0, sizeof(mask));
+    if (nodes) {
+        if (parse_cpus(nodes, &node_set) == -1) {
+            fprintf(stderr, "pyq: bad PYQ_MEMPOLICY nodes: %s\n", nodes);
+            return -1;
+        }
+        for (i = 0; i < CPU_SETSIZE; i++) {
+            if (CPU_ISSET(i, &node_set))
+                mask[i / (8 * sizeof(unsigned long))] |=
+                    1UL << (i % (8 * sizeof(unsigned long)));
+        }
+    }
+    /* maxnode is one more than the number of bits in mask (see
+       set_mempolicy(2) and libnuma). */
+    if (syscall(SYS_set_mempolicy, mode, nodes ? mask : NULL,
+                nodes ? CPU_SETSIZE + 1 : 0) == -1) {
+        perror("pyq: set_mempolicy");
+        return -1;
+    }
+    return 0;
+}
+
+static void
+print_topology(const char *threads)
+{
+    cpu_set_t set;
+    unsigned long mask[NODEMASK_LONGS];
+    int mode, i;
+    if (sched_getaffinity(0, sizeof(set), &set) == 0) {
+        printf("cpus = ");
+        print_set(&set);
+    }
+    if (syscall(SYS_get_mempolicy, &mode, mask, CPU_SETSIZE + 1,
+                NULL, 0) == 0) {
+        printf("mempolicy = %s",
+               0 <= mode && mode < 4 ? mpol_names[mode] : "?");
+        if (mode != PYQ_MPOL_DEFAULT) {
+            printf(" nodes =");
+            for (i = 0; i < CPU_SETSIZE; i++) {
+                if (mask[i / (8 * sizeof(unsigned long))] >>
+                    (i % (8 * sizeof(unsigned long))) & 1)
+                    printf(" %d", i);
+            }
+        }
+        printf("\n");
+    }
+    printf("threads = %s\n", threads ? threads : "0");
+}
 #else /* __linux__ */
     #error "Unsupported OS"
 #endif
@@ -244,6 +352,37 @@ find_q(const char* progpath)
     return qpath;
 }
 
+/* Python side thread pools sized by PYQ_THREADS unless set explicitly */
+static const char *thread_vars[] = {"OMP_NUM_THREADS",
+                                    "OPENBLAS_NUM_THREADS",
+                                    "MKL_NUM_THREADS",
+                                    "NUMEXPR_NUM_THREADS", NULL};
+
+/* PYQ_THREADS=n starts q with n secondary threads (-s n).  Stores n
+   (or NULL if it is not set) in *threads and returns -1 if n is not a
+   positive number. */
+static int
+q_threads(char **threads)
+{
+    const char **var;
+    char *end, *n = getenv("PYQ_THREADS");
+    long value;
+    *threads = NULL;
+    if (n == NULL || !*n)
+        return 0;
+    errno = 0;
+    value = strtol(n, &end, 10);
+    if (errno || *end || end == n || value <= 0 || value > INT_MAX) {
+        fprintf(stderr, "pyq: PYQ_THREADS must be a positive number, "
+                "not %s\n", n);
+        return -1;
+    }
+    for (var = thread_vars; *var; ++var)
+        setenv(*var, n, 0);
+    *threads = n;
+    return 0;
+}
+
 #define NPATHS 4
 
 int
@@ -251,7 +390,7 @@ main(int argc, char *argv[])
 {
     char *tried_paths[NPATHS];
     int rc = 0, i, n;
-    char **args, *p, *qpath;
+    char **args, *p, *qpath, *threads;
     char *fullprogpath;
     pyq_trace = argc > 1 && !strcmp("--pyq-trace", argv[1]);
     if (pyq_trace) {
@@ -263,7 +402,9 @@ main(int argc, char *argv[])
         argv[argc] = NULL;
         printf("pyq trace is on\n");
     }
-    args = malloc((sizeof (char*)) * (argc + 3));
+    if (q_threads(&threads) == -1)
+        return 1;
+    args = malloc((sizeof (char*)) * (argc + 5));
     fullprogpath = get_progpath(argv[0]);
 #ifdef __APPLE__
 
@@ -272,8 +413,13 @@ main(int argc, char *argv[])
 #endif
     args[0] = fullprogpath;
     args[1] = "python.q";
-    args[argc + 1] = "-q";
-    args[argc + 2] = NULL;
+    n = argc + 1;
+    if (threads) {
+        args[n++] = "-s";
+        args[n++] = threads;
+    }
+    args[n++] = "-q";
+    args[n] = NULL;
     for (i = 1; i < argc; ++i) {
         if (argv[i][0] == '-' && strlen(argv[i] + 1) == 1) {
             args[i+1] = p = malloc(4);
@@ -288,6 +434,10 @@ main(int argc, char *argv[])
     TRACE("prog = %s\n", fullprogpath);
 #ifdef __linux__
     taskset();
+    if (mempolicy() == -1)
+        return 1;
+    if (pyq_trace)
+        print_topology(threads);
 #endif
 
     for(i = 0; ;++i) {
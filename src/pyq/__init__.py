@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
 import itertools
 from datetime import datetime, date, time
 from collections import Mapping as _Mapping
@@ -12,12 +13,18 @@ except ImportError:
     import builtins as __builtin__
 import sys
 import os
+import struct
 
 try:
     import numpy as _np
 except ImportError:
     _np = None
 
+try:
+    from pickle import PickleBuffer as _PickleBuffer
+except ImportError:  # Python < 3.8
+    _PickleBuffer = None
+
 try:
     from ._k import K as _K, error as kerr, Q_VERSION, Q_DATE, Q_OS
 except ImportError:
@@ -204,9 +211,28 @@ class K(_K):
 
     def __reduce_ex__(self, proto):
         x = self._b9(1, self)
+        if proto >= 5 and _PickleBuffer is not None:
+            # Let the pickler pass the serialized data out-of-band.
+            return (d9, (_PickleBuffer(x),))
         b = memoryview(x).tobytes()
         return (d9, (b,))
 
+    def dump(self, file, compress=False, chunk_size=1 << 20):
+        """Write self to a binary file object in q's IPC format
+
+        Tables are written column by column in pieces of about chunk_size
+        bytes, so that the whole table is never serialized at once.  Use
+        K.load_stream to read the data back.
+
+        >>> import io
+        >>> f = io.BytesIO()
+        >>> q('([]a:til 3;b:"xyz")').dump(f)
+        >>> _ = f.seek(0)
+        >>> K.load_stream(f)
+        k('+`a`b!(0 1 2;"xyz")')
+        """
+        _dump(self, file, compress, chunk_size)
+
     def __getitem__(self, x):
         """
         >>> k("10 20 30 40 50")[k("1 3")]
@@ -362,6 +388,13 @@ class K(_K):
         """
         return self._k(0, 'key', self)
 
+    def _repr_html_(self):
+        """HTML for notebooks: the first and last rows of a table or
+        dictionary (see pyq.display)"""
+        if self._t in (98, 99):
+            from .display import html
+            return html(self)
+
     def show(self, start=0, geometry=None, output=None):
         """pretty-print data to the console
 
@@ -521,7 +554,13 @@ class K(_K):
         return str(self)
 
     def __sizeof__(self):
-        return object.__sizeof__(self) + int(self._sizeof())
+        """Size in bytes, including memory referenced from elsewhere
+
+        Memory-mapped data is not included.  Use x._sizes() for a
+        breakdown into exclusive, shared and mapped bytes.
+        """
+        exclusive, shared, mapped = self._sizes()
+        return object.__sizeof__(self) + exclusive + shared
 
     def __fspath__(self):
         """Return the file system path representation of the object."""
@@ -544,6 +583,14 @@ if _PY3K:
 
 
 def _q_builtins():
+    """Return a list of (attribute, name) pairs for q builtins
+
+    The list is computed once; the builtins themselves are evaluated
+    on first access (see _Builtin).
+    """
+    global _builtins
+    if _builtins is not None:
+        return _builtins
     from keyword import iskeyword
 
     # Allow _q_builtins() to be called before q is defined
@@ -563,41 +610,77 @@ def _q_builtins():
         for new in ['scov', 'svar', 'sdev']:
             names.remove(new)
 
-    pairs = []
-    for x in names:
-        attr = x
-        if iskeyword(x):
-            attr += '_'
-        pairs.append((attr, q(x)))
+    _builtins = [(x + '_' if iskeyword(x) else x, x) for x in names]
+    return _builtins
 
-    return pairs
+
+_builtins = None
+
+
+class _Builtin(object):
+    """q builtin that is evaluated on first access
+
+    Once evaluated, the K object replaces the descriptor in the class
+    dictionary, so subsequent lookups cost nothing extra.
+    """
+    __slots__ = ('cls', 'attr', 'name', 'value')
+
+    def __init__(self, cls, attr, name):
+        self.cls = cls
+        self.attr = attr
+        self.name = name
+        self.value = None
+
+    def __get__(self, instance, owner):
+        f = self.value
+        if f is None:
+            f = self.value = K._k(0, self.name)
+            if self.cls.__dict__.get(self.attr) is self:
+                setattr(self.cls, self.attr, f)
+        return f.__get__(instance, owner)
+
+
+OPERATORS_BLOB = 'pyq-operators.qb'
+# Install the definitions from the blob f if it was made from a script
+# with the md5 hex digest h.
+_LOAD_OPERATORS_BLOB = ('{[h;f]b:-9!read1 hsym f;'
+                        '$[h~first b;[.[`.p;();,;last b];1b];0b]}')
+
+
+def _load_operators():
+    """Define the .p helpers and return the operator table .p.ops
+
+    setup.py serializes the definitions from pyq-operators.q into
+    pyq-operators.qb in QHOME (q's default ~/q if QHOME is not set), so
+    that they are read with a single -9! instead of parsing the script.
+    The blob records the md5 digest of the script it was made from; the
+    script is loaded with \\l if the blob is missing or the digest does
+    not match.
+    """
+    home = os.environ.get('QHOME') or os.path.expanduser('~/q')
+    script = os.path.join(home, 'pyq-operators.q')
+    blob = os.path.join(home, OPERATORS_BLOB)
+    if os.path.exists(blob):
+        try:
+            with open(script, 'rb') as f:
+                digest = hashlib.md5(f.read()).hexdigest()
+        except (IOError, OSError):
+            digest = None
+        if digest and K._k(0, _LOAD_OPERATORS_BLOB, K._ks(digest), blob):
+            return K._k(0, '.p.ops')
+    K._k(0, r'\l pyq-operators.q')
+    return K._k(0, '.p.ops')
 
 
 def _genmethods(cls):
-    q('\l pyq-operators.q')
-    cls._show = q('{` sv .Q.S[y;z;x]}')
-    cls._sizeof = q('.p.sizeof')
-    for spec, verb in [
-        ('add', '+'), ('sub', '-'), ('rsub', '{y-x}'),
-        ('mul', '*'), ('pow', 'xexp'), ('rpow', '{y xexp x}'),
-        ('xor', '^'), ('rxor', '{y^x}'),
-        ('truediv', '%'), ('rtruediv', '{y%x}'),
-        ('floordiv', 'div'), ('rfloordiv', '{y div x}'),
-        ('and', '&'), ('or', '|'),
-        ('mod', 'mod'), ('rmod', '{y mod x}'), ('invert', 'not'),
-        ('pos', '{@[flip;x;x]}'), ('neg', '-:'), ('abs', 'abs'),
-        # x @ y - composition if y is a function, x[y] otherwise.
-        ('matmul', "{$[100>type y;x y;'[x;y]]}"),
-        ('rmatmul', "{$[100>type x;y x;'[y;x]]}"),
-    ]:
-        setattr(cls, '__%s__' % spec, q(verb))
-
-    for spec in 'add mul and or'.split():
-        setattr(cls, '__r%s__' % spec, getattr(cls, '__%s__' % spec))
-
-    for x, f in _q_builtins():
+    ops = _load_operators()
+    cls._show = q('.p.show')
+    for spec, f in zip(q('key', ops), q('value', ops)):
+        setattr(cls, '__%s__' % spec, f)
+
+    for x, name in _q_builtins():
         if not hasattr(cls, x):
-            setattr(cls, x, f)
+            setattr(cls, x, _Builtin(cls, x, name))
 
     def cmp_op(op):
         def dunder(self, other):
@@ -612,16 +695,105 @@ def _genmethods(cls):
     for spec, verb in [('gt', '>'), ('lt', '<'), ('ge', '>='), ('le', '<=')]:
         setattr(cls, '__%s__' % spec, cmp_op(verb))
 
-    # Shift operators
-    for x in ['', 'r']:
-        for y in 'lr':
-            op = x + y + 'shift'
-            setattr(cls, '__%s__' % op, q('.p.' + op))
-
 
 def d9(x):
-    """like K._d9, but takes python bytes"""
-    return K._d9(K._kp(x))
+    """like K._d9, but takes python bytes or another buffer
+
+    A view of a whole K byte vector is deserialized without copying;
+    any other buffer, including a slice of a K byte vector, is copied.
+    """
+    if isinstance(x, bytes):
+        return K._d9(K._kp(x))
+    m = memoryview(x)
+    obj = getattr(m, 'obj', None)
+    if (isinstance(obj, K) and obj._t == 4 and m.contiguous and
+            m.nbytes == len(obj)):
+        return K._d9(obj)
+    return K._d9(K._kp(m.tobytes()))
+
+
+_FRAME = struct.Struct('<q')
+
+
+def _write_frame(file, x, compress):
+    b = K._k(0, '-18!', x) if compress else K._b9(1, x)
+    file.write(_FRAME.pack(len(b)))
+    file.write(memoryview(b))
+
+
+def _readinto(file, b):
+    m = memoryview(b)
+    while len(m):
+        n = file.readinto(m)
+        if not n:
+            raise EOFError("truncated K stream")
+        m = m[n:]
+
+
+def _read_frame(file):
+    header = bytearray(_FRAME.size)
+    _readinto(file, header)
+    n, = _FRAME.unpack(header)
+    b = K._ktn(4, n)
+    _readinto(file, b)
+    return K._d9(b)
+
+
+def _chunk_rows(x, chunk_size):
+    """Estimate the number of rows of x that serialize to chunk_size bytes"""
+    n = min(len(x), 1000)
+    size = int(K._k(0, '{-22!x sublist y}', K._kj(n), x))
+    return max(1, chunk_size * n // size)
+
+
+def _dump(x, file, compress, chunk_size):
+    t = x._t
+    if t == 98:
+        cols = x.cols
+        n = len(x)
+        # Chunking drops column attributes, so they are sent separately.
+        attrs = K._k(0, '{attr each value flip x}', x)
+        _write_frame(file, K._K([K._kh(t), cols, K._kj(n), attrs]),
+                     compress)
+        for c in cols:
+            col = x[c]
+            step = _chunk_rows(col, chunk_size)
+            # An empty column is still written once to keep its type.
+            for i in range(0, max(n, 1), step):
+                chunk = K._k(0, 'sublist', K._J([i, step]), col)
+                _write_frame(file, chunk, compress)
+    elif t == 99 and x.key._t == 98 and x.value._t == 98:
+        _write_frame(file, K._K([K._kh(t)]), compress)
+        _dump(x.key, file, compress, chunk_size)
+        _dump(x.value, file, compress, chunk_size)
+    else:
+        _write_frame(file, K._K([K._kh(t)]), compress)
+        _write_frame(file, x, compress)
+
+
+def _load(file):
+    """Read a K object written by K.dump from a binary file object"""
+    header = _read_frame(file)
+    t = int(header[0])
+    if t == 98:
+        cols, n, attrs = header[1], int(header[2]), header[3]
+        columns = []
+        for c in cols:
+            chunks = [_read_frame(file)]
+            m = len(chunks[0])
+            while m < n:
+                chunks.append(_read_frame(file))
+                m += len(chunks[-1])
+            if len(chunks) == 1:
+                columns.append(chunks[0])
+            else:
+                columns.append(K._k(0, 'raze', K._K(chunks)))
+        return K._k(0, '{flip x!{$[x~attr y;y;x#y]}\'[z;y]}',
+                    cols, K._K(columns), attrs)
+    if t == 99:
+        key = _load(file)
+        return K._k(0, '!', key, _load(file))
+    return _read_frame(file)
 
 
 def k(m, *args):
@@ -633,8 +805,6 @@ class _Q(object):
 
     def __init__(self):
         object.__setattr__(self, '_cmd', None)
-        object.__setattr__(self, '_q_names',
-                           [name for name, _ in _q_builtins()])
 
     def __call__(self, m=None, *args):
         """Execute q code."""
@@ -668,7 +838,7 @@ class _Q(object):
         k(0, "delete %s from `." % attr)
 
     def __dir__(self):
-        return self._q_names + list(self.key('.'))
+        return [x for x, _ in _q_builtins()] + list(self.key('.'))
 
 
 q = _Q()
@@ -782,6 +952,79 @@ __builtin__.__import__ = __import__
 
 _genmethods(K)
 del _genmethods, _imp
+K.load_stream = staticmethod(_load)
+
+
+###############################################################################
+# Compiled Python code callable from q: .p.compile, .p.exec and .p.free
+###############################################################################
+_code = {}
+_code_ids = itertools.count(1)
+
+
+def _p_compile(source):
+    """Compile Python source and return a handle for .p.exec
+
+    If the last statement is an expression, .p.exec returns its value.
+
+    >>> h = q('.p.compile', 'x = 6\\nx * 7')
+    >>> q('.p.exec', h, None)
+    k('42')
+    >>> q('.p.free', h)
+    k('::')
+    """
+    import ast
+    source = str(source)
+    tree = ast.parse(source, '<p>', 'exec')
+    last = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = compile(ast.Expression(tree.body.pop().value), '<p>', 'eval')
+    body = compile(tree, '<p>', 'exec')
+    h = next(_code_ids)
+    _code[h] = body, last
+    return h
+
+
+def _p_exec(h, args, globals=None):
+    """Run the code compiled by .p.compile
+
+    The code runs in globals, which defaults to the namespace of __main__.
+    args is a dictionary from names to values that are bound in a copy of
+    globals, so that comprehensions and lambdas see them as well.  If args
+    is ::, the code runs like a p) line: names it assigns become globals.
+    """
+    try:
+        body, last = _code[int(h)]
+    except KeyError:
+        raise KeyError("invalid code handle: %s" % h)
+    if globals is None:
+        globals = sys.modules['__main__'].__dict__
+    if args._t == 99:
+        ns = dict(globals)
+        ns.update(zip(map(str, q.key(args)), q.value(args)))
+    else:
+        ns = globals
+    exec(body, ns)
+    if last is not None:
+        return eval(last, ns)
+
+
+def _p_free(h):
+    """Release the code compiled by .p.compile"""
+    _code.pop(int(h), None)
+
+
+q('{.p.compile:{x enlist y}x;.p.exec:{x(y;z)}y;.p.free:{x enlist y}z}',
+  K._func(_p_compile), K._func(_p_exec), K._func(_p_free))
+
+
+def mmap_table(path):
+    """Map the columns of the splayed table at path as numpy arrays
+
+    Returns a pyq.hdb.MappedTable.
+    """
+    from .hdb import MappedTable
+    return MappedTable(path)
 
 
 def versions():
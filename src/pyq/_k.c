@@ -184,6 +184,7 @@ kv(I i)
 #include <stdlib.h>
 typedef struct {
     PyObject_HEAD K x;
+    J nbytes;           /* q bytes accounted to this object */
 } KObject;
 
 static PyTypeObject K_Type;
@@ -257,11 +258,166 @@ ZK k_noargs;
 
 static PyObject *ErrorObject;
 
+#define SIZE_SP ((J)sizeof(void *))
+#if KXVER >= 3
+#define SIZE_SN 8
+#else
+#define SIZE_SN 4
+#endif
+Z J k_item_size[20] = {
+    0, 1, 16, 0, 1, 2, 4, 8, 4, 8, 1, SIZE_SP, 8, 4, 4, 8, 8, 4, 4, 4,
+};
+
+/* Accounting of q memory referenced by live K objects.  Each object is
+   charged for its own header and data, and tables and dictionaries also
+   for their columns.  The charge is per K object: q objects referenced
+   by several K objects (or shared between columns) are counted once for
+   each, so live_bytes is an upper bound of the q memory held from
+   Python.  With tracemalloc tracing, objects are traced in their own
+   domain at the address of the Python object, so that the q memory can
+   be attributed to the Python code that holds it.  The counters are
+   protected by the GIL. */
+#define TRACEMALLOC_DOMAIN 0x71  /* 'q' */
+Z J live_objects, live_bytes;
+
+Z J
+kobject_bytes(K x, int depth)
+{
+    J n = 8 + SIZE_SN;
+    if (xt < 0 || xt >= 100)
+        return 16;
+    if (xt == 0) {
+        n += SIZE_SP * xn;
+        if (depth > 0)
+            DO(xn, n += kobject_bytes(xK[i], depth - 1));
+        return n;
+    }
+    if (xt < 20)
+        return n + k_item_size[xt] * xn;
+    if (xt < ENUMS_END)
+        return n + 4 * xn;
+    if (xt == 98)
+        return 16 + kobject_bytes(x->k, 1);
+    if (xt == 99)
+        return 16 + kobject_bytes(xx, depth) + kobject_bytes(xy, depth);
+    return n;
+}
+
+static void
+kobject_track(KObject *self)
+{
+    self->nbytes = kobject_bytes(self->x, 0);
+    live_objects++;
+    live_bytes += self->nbytes;
+#if PY_VERSION_HEX >= 0x03070000
+    PyTraceMalloc_Track(TRACEMALLOC_DOMAIN, (uintptr_t)self,
+                        (size_t)self->nbytes);
+#endif
+}
+
+static void
+kobject_untrack(KObject *self)
+{
+    live_objects--;
+    live_bytes -= self->nbytes;
+#if PY_VERSION_HEX >= 0x03070000
+    PyTraceMalloc_Untrack(TRACEMALLOC_DOMAIN, (uintptr_t)self);
+#endif
+}
+
+/* q's memory manager may only be used on q's threads: the main thread
+   and the threads from which q calls Python (peach).  K objects dropped
+   on other Python threads are queued and released on the main thread. */
+#ifdef _MSC_VER
+#define THREAD_LOCAL __declspec(thread)
+#else
+#define THREAD_LOCAL __thread
+#endif
+Z THREAD_LOCAL I q_thread, main_thread;
+
+/* Allocation of K objects.  Deallocated objects are kept in a bounded
+   free list and reused for any type with the same layout (K and its
+   subclasses without instance dictionaries).  Common atoms - ::, 0b, 1b
+   and small longs - created on the main thread are cached and shared.
+   An atom whose buffer is exported is removed from the cache, so that
+   changes made through the buffer are not seen by later lookups.
+   The free list relies on PyObject_Init increasing the reference count
+   of heap types, so it is only used with Python 3.8+. */
+#if PY_VERSION_HEX >= 0x03080000
+#define KOBJECT_FREELIST_MAX 256
+#else
+#define KOBJECT_FREELIST_MAX 0
+#endif
+#define SMALL_LONG_MIN -5
+#define SMALL_LONG_MAX 256
+Z KObject *free_list;
+Z int numfree, freelist_max = KOBJECT_FREELIST_MAX;
+Z J nallocated, nreused, ncached;
+Z KObject *k_bools[2], *k_identity;
+Z KObject *k_small_longs[SMALL_LONG_MAX - SMALL_LONG_MIN + 1];
+
+#define KOBJECT_REUSABLE(type) ((type)->tp_basicsize == sizeof(KObject) \
+                                && (type)->tp_itemsize == 0 \
+                                && !PyType_IS_GC(type))
+
+static KObject **
+kobject_cache_slot(K x)
+{
+    switch (xt) {
+    case -KB:
+        return &k_bools[xg != 0];
+    case -KJ:
+        if (xj >= SMALL_LONG_MIN && xj <= SMALL_LONG_MAX)
+            return &k_small_longs[xj - SMALL_LONG_MIN];
+        break;
+    case 101:
+        if (xj == 0)
+            return &k_identity;
+    }
+    return NULL;
+}
+
+static int
+kobject_is_cached(KObject *self)
+{
+    KObject **slot = kobject_cache_slot(self->x);
+    return slot != NULL && *slot == self;
+}
+
+static KObject *
+kobject_alloc(PyTypeObject *type)
+{
+    KObject *self;
+    if (free_list != NULL && KOBJECT_REUSABLE(type)) {
+        self = free_list;
+        free_list = (KObject *)self->x;
+        numfree--;
+        nreused++;
+        PyObject_Init((PyObject *)self, type);
+        return self;
+    }
+    nallocated++;
+    return (KObject *) type->tp_alloc(type, 0);
+}
+
+static void
+kobject_free(KObject *self)
+{
+    PyTypeObject *type = Py_TYPE(self);
+    if (numfree < freelist_max && KOBJECT_REUSABLE(type)) {
+        self->x = (K)free_list;
+        free_list = self;
+        numfree++;
+    }
+    else
+        type->tp_free(self);
+}
+
 /* always consumes x reference */
 static PyObject *
 KObject_FromK(PyTypeObject * type, K x)
 {
-    KObject *self;
+    KObject *self, **slot;
 
     if (!type)
         type = &K_Type;
@@ -273,9 +429,25 @@ KObject_FromK(PyTypeObject * type, K x)
         PyErr_SetString(ErrorObject, xs ? xs : (S) "not set");
         R r0(x), NULL;
     }
-    self = (KObject *) type->tp_alloc(type, 0);
-    if (self)
+    /* atoms made on other threads may be on another thread's heap */
+    slot = main_thread ? kobject_cache_slot(x) : NULL;
+    if (slot != NULL && *slot != NULL && Py_TYPE(*slot) == type) {
+        ncached++;
+        r0(x);
+        Py_INCREF(*slot);
+        R (PyObject *) *slot;
+    }
+    self = kobject_alloc(type);
+    if (self) {
         self->x = x;
+        kobject_track(self);
+        if (slot != NULL) {
+            /* cache atoms of the most recently requested type */
+            Py_XDECREF(*slot);
+            Py_INCREF(self);
+            *slot = self;
+        }
+    }
     else
         r0(x);
 
@@ -301,13 +473,64 @@ getK(PyObject *arg, void *addr)
     return 1;
 }
 
+Z PyThread_type_lock deferred_lock;
+Z K *deferred;
+Z J deferred_n, deferred_cap;
+
+Z J
+release_deferred(void)
+{
+    K *a;
+    J n;
+    if (!deferred_n)
+        return 0;
+    PyThread_acquire_lock(deferred_lock, WAIT_LOCK);
+    a = deferred;
+    n = deferred_n;
+    deferred = NULL;
+    deferred_n = deferred_cap = 0;
+    PyThread_release_lock(deferred_lock);
+    DO(n, r0(a[i]));
+    free(a);
+    return n;
+}
+
+Z I
+defer_r0(K x)
+{
+    I ok = 1;
+    PyThread_acquire_lock(deferred_lock, WAIT_LOCK);
+    if (deferred_n == deferred_cap) {
+        J cap = deferred_cap ? 2 * deferred_cap : 64;
+        K *a = realloc(deferred, cap * sizeof(K));
+        if (a) {
+            deferred = a;
+            deferred_cap = cap;
+        }
+        else
+            ok = 0;
+    }
+    if (ok)
+        deferred[deferred_n++] = x;
+    PyThread_release_lock(deferred_lock);
+    return ok;
+}
+
 static void
 K_dealloc(KObject * self)
 {
     if (self->x) {
-        r0(self->x);
+        kobject_untrack(self);
+        if (main_thread) {
+            release_deferred();
+            r0(self->x);
+        }
+        else if (q_thread)
+            r0(self->x);
+        else
+            defer_r0(self->x); /* on failure, leak rather than corrupt */
     }
-    Py_TYPE(self)->tp_free(self);
+    kobject_free(self);
 }
 
 static PyObject *
@@ -578,6 +801,8 @@ K_ja(KObject * self, PyObject *arg)
             R PyErr_Format(PyExc_NotImplementedError, "appending to type %d",
                            (int)self->x->t);
     }
+    kobject_untrack(self);
+    kobject_track(self);
     Py_RETURN_NONE;
 }
 
@@ -587,7 +812,11 @@ K_jv(KObject * self, KObject * arg)
     if (!K_Check(arg))
         R PyErr_Format(PyExc_TypeError, "K._jv: expected K object, not %s",
                        Py_TYPE(arg)->tp_name);
+    if (self->x->t < 0)
+        R PyErr_Format(PyExc_TypeError, "K._jv: cannot append to an atom");
     jv(&self->x, arg->x);
+    kobject_untrack(self);
+    kobject_track(self);
     Py_RETURN_NONE;
 }
 
@@ -790,6 +1019,11 @@ K_array_struct_get(KObject * self)
     else {
         inter->shape = inter->strides = NULL;
         inter->data = &xg;
+        if (kobject_is_cached(self)) {
+            /* the array may write to the atom, so stop sharing it */
+            *kobject_cache_slot(x) = NULL;
+            Py_DECREF(self);
+        }
     }
     Py_INCREF(self);
 #if PY_MAJOR_VERSION >= 3
@@ -1206,6 +1440,21 @@ c_contiguous(PyArrayInterface *inter)
     }
 }
 
+/* Copies of at least this many bytes are done without holding the GIL.
+   The source array is kept alive by the capsule and the destination is
+   not visible to Python yet, so neither can change under us. */
+#define NOGIL_COPY_SIZE (1 << 20)
+#define COPY_NOGIL(nbytes, stmt) do {           \
+        if ((nbytes) >= NOGIL_COPY_SIZE) {      \
+            Py_BEGIN_ALLOW_THREADS              \
+            stmt;                               \
+            Py_END_ALLOW_THREADS                \
+        }                                       \
+        else {                                  \
+            stmt;                               \
+        }                                       \
+    } while (0)
+
 ZK
 _from_array_struct(PyTypeObject * type, PyObject *arg)
 {
@@ -1305,19 +1554,22 @@ _from_array_struct(PyTypeObject * type, PyObject *arg)
         }
     } else if (t == KD || t == KM) {
         if (inter->nd) {
-            DO(inter->shape[0], xI[i] = (I)(offset + scale * *(long long *)((S)inter->data + i * inter->strides[0])));
+            COPY_NOGIL(size * itemsize,
+                DO(inter->shape[0], xI[i] = (I)(offset + scale * *(long long *)((S)inter->data + i * inter->strides[0]))));
         }
         else
             xi = (I)(offset + scale * *(long long *)inter->data);
     } else if (t == KP) {
         if (inter->nd) {
-            DO(inter->shape[0], xJ[i] = offset + scale * *(long long *)((S)inter->data + i * inter->strides[0]));
+            COPY_NOGIL(size * itemsize,
+                DO(inter->shape[0], xJ[i] = offset + scale * *(long long *)((S)inter->data + i * inter->strides[0])));
         }
         else
             xj = offset + scale * *(long long *)inter->data;
     } else if (t == KN && scale != 1) {
         if (inter->nd) {
-            DO(inter->shape[0], xJ[i] = (J)(scale * *(long long *)((S)inter->data + i * inter->strides[0])));
+            COPY_NOGIL(size * itemsize,
+                DO(inter->shape[0], xJ[i] = (J)(scale * *(long long *)((S)inter->data + i * inter->strides[0]))));
         }
         else
             xj = (J)(scale * *(long long *)inter->data);
@@ -1325,12 +1577,14 @@ _from_array_struct(PyTypeObject * type, PyObject *arg)
     else {
         void *dest = (xt < 0)?&xg:xG;
         if (c_contiguous(inter)) {
-                memcpy(dest, inter->data, (size_t)(size * itemsize));
+                COPY_NOGIL(size * itemsize,
+                    memcpy(dest, inter->data, (size_t)(size * itemsize)));
         }
         else {
             if (inter->nd == 1) {
                 Py_intptr_t n = inter->shape[0];
-                DO(n, memcpy(xG + i * itemsize, (S)inter->data + i * inter->strides[0], itemsize));
+                COPY_NOGIL(size * itemsize,
+                    DO(n, memcpy(xG + i * itemsize, (S)inter->data + i * inter->strides[0], itemsize)));
             }
             else {
                 r0(x);r0(shape);
@@ -1387,6 +1641,8 @@ Z K di(I d)
 {
     PyObject *r;
     PyGILState_STATE gstate = PyGILState_Ensure();
+    if (main_thread)
+        release_deferred();
     r = PyObject_CallFunction(cb[d], "i", d);
     if (r == NULL) {
         if (debug)
@@ -2979,6 +3235,147 @@ K_d9(PyTypeObject * type, PyObject *args)
     return KObject_FromK(type, d9(x));
 }
 
+/* Memory used by a K object, split into bytes referenced only from the
+   object (exclusive), bytes of sub-objects that have other references
+   (shared, counted once), and memory-mapped vectors (mapped).  Sizes
+   follow the layout used by .p.sizeof. */
+#if KXVER >= 3
+#define IS_MAPPED(x) ((x)->m != 0)
+#else
+#define IS_MAPPED(x) 0
+#endif
+#define SIZES_MAX_DEPTH 1000
+
+typedef struct {
+    J exclusive, shared, mapped;
+    K *seen;            /* open addressing set of shared objects */
+    size_t nseen, cap;
+} ksizes;
+
+/* Return 1 if x has already been seen, 0 if it was added and -1 on
+   memory error. */
+static int
+ksizes_seen(ksizes *s, K x)
+{
+    size_t i;
+    if (2 * (s->nseen + 1) > s->cap) {
+        size_t j, cap = s->cap ? 2 * s->cap : 64;
+        K *seen = calloc(cap, sizeof(K));
+        if (seen == NULL)
+            return -1;
+        for (j = 0; j < s->cap; ++j) {
+            K y = s->seen[j];
+            if (y) {
+                i = ((size_t)y >> 4) & (cap - 1);
+                while (seen[i])
+                    i = (i + 1) & (cap - 1);
+                seen[i] = y;
+            }
+        }
+        free(s->seen);
+        s->seen = seen;
+        s->cap = cap;
+    }
+    i = ((size_t)x >> 4) & (s->cap - 1);
+    while (s->seen[i]) {
+        if (s->seen[i] == x)
+            return 1;
+        i = (i + 1) & (s->cap - 1);
+    }
+    s->seen[i] = x;
+    s->nseen++;
+    return 0;
+}
+
+static int ksizes_walk(ksizes *s, K x, int shared, int depth);
+
+static int
+ksizes_child(ksizes *s, K x, int shared, int depth)
+{
+    if (!shared && x->r > 0)
+        shared = 1;
+    if (shared) {
+        int seen = ksizes_seen(s, x);
+        if (seen)
+            return seen < 0 ? -1 : 0;
+    }
+    return ksizes_walk(s, x, shared, depth + 1);
+}
+
+static int
+ksizes_walk(ksizes *s, K x, int shared, int depth)
+{
+    J *acc = IS_MAPPED(x) ? &s->mapped : shared ? &s->shared : &s->exclusive;
+    int t = xt;
+    K y;
+
+    if (depth > SIZES_MAX_DEPTH)
+        return 0;
+    if (t < 0) {
+        *acc += 8 + (t > -20 ? k_item_size[-t] : 4);
+    }
+    else if (t == 0) {
+        *acc += 8 + SIZE_SN + SIZE_SP * xn;
+        DO(xn, if (ksizes_child(s, xK[i], shared, depth) < 0) return -1);
+    }
+    else if (t < 20) {
+        *acc += 8 + SIZE_SN + k_item_size[t] * xn;
+    }
+    else if (t < 77) {  /* enumerations */
+        *acc += 8 + SIZE_SN + 4 * xn;
+    }
+    else if (t < 97) {  /* mapped nested lists */
+        J m = 0;
+        y = k(0, "sum count each", r1(x), (K)0);
+        if (y) {
+            if (y->t == -KJ)
+                m = y->j;
+            else if (y->t == -KI)
+                m = y->i;
+            r0(y);
+        }
+        s->mapped += 8 + SIZE_SN + 8 * xn + k_item_size[t - 77] * m;
+    }
+    else if (t == 98) {
+        *acc += 8 + 8 + SIZE_SP;
+        return ksizes_child(s, x->k, shared, depth);
+    }
+    else if (t == 99) {
+        *acc += 8 + 8 + 2 * SIZE_SP;
+        if (ksizes_child(s, xx, shared, depth) < 0)
+            return -1;
+        return ksizes_child(s, xy, shared, depth);
+    }
+    else {  /* functions - count their value */
+        int r = 0;
+        *acc += 8;
+        y = k(0, "value", r1(x), (K)0);
+        if (y) {
+            if (y->t != -128)
+                r = ksizes_walk(s, y, shared, depth + 1);
+            r0(y);
+        }
+        return r;
+    }
+    return 0;
+}
+
+PyDoc_STRVAR(K_sizes_doc, "sizes() -> (exclusive, shared, mapped)\n\n"
+             "Return memory used by a K object in bytes.\n\n"
+             "Sub-objects that are also referenced from elsewhere are "
+             "counted once as shared,\nand memory-mapped vectors are "
+             "counted separately.\n");
+static PyObject *
+K_sizes(KObject *self)
+{
+    ksizes s = {0, 0, 0, NULL, 0, 0};
+    int r = ksizes_walk(&s, self->x, 0, 0);
+    free(s.seen);
+    if (r < 0)
+        return PyErr_NoMemory();
+    return Py_BuildValue("LLL", s.exclusive, s.shared, s.mapped);
+}
+
 PyDoc_STRVAR(K_inspect_doc, "inspect(k, c, [, i]) -> python object");
 static PyObject *
 K_inspect(PyObject *self, PyObject *args)
@@ -3120,6 +3517,7 @@ call_python_object(K type, K func, K x)
         args = xK;
     }
     gstate = PyGILState_Ensure();
+    q_thread++;
 
     v = PyTuple_New((Py_ssize_t)n);
 
@@ -3155,6 +3553,7 @@ call_python_object(K type, K func, K x)
     Py_DECREF(v);
   done:
     Py_XDECREF(res);
+    q_thread--;
     PyGILState_Release(gstate);
     return r;
 }
@@ -3209,6 +3608,7 @@ static PyMethodDef K_methods[] = {
     {"_a1", (PyCFunction)K_a1, METH_O, "a1"},
     {"_ja", (PyCFunction)K_ja, METH_O, "append atom"},
     {"_jv", (PyCFunction)K_jv, METH_O, "append vector"},
+    {"_sizes", (PyCFunction)K_sizes, METH_NOARGS, K_sizes_doc},
     {"_k", (PyCFunction)K_k, METH_VARARGS | METH_CLASS, K_k_doc},
     {"_knk", (PyCFunction)K_knk, METH_VARARGS | METH_CLASS, K_knk_doc},
     {"_ktd", (PyCFunction)K_ktd, METH_VARARGS | METH_CLASS, K_ktd_doc},
@@ -3354,6 +3754,11 @@ _k_getbuffer(KObject * self, Py_buffer * view, int flags, int raw)
 #endif
         view->buf = &x->g;
         view->readonly = 0;
+        if (kobject_is_cached(self)) {
+            /* the caller holds another reference to self */
+            *kobject_cache_slot(x) = NULL;
+            Py_DECREF(self);
+        }
     }
     else {
         static Py_ssize_t suboffsets[2] = {
@@ -3967,6 +4372,82 @@ _k_setm(PyObject *self, PyObject *arg)
 }
 #endif /* KXVER>=3 */
 
+PyDoc_STRVAR(_k_release_deferred_doc, "release_deferred() -> int\n\n"
+             "Release K objects dropped on non-q threads.\n\n"
+             "Must be called on q's main thread.  Returns the number of "
+             "objects released.\n");
+static PyObject *
+_k_release_deferred(PyObject *self)
+{
+    if (!main_thread) {
+        PyErr_SetString(PyExc_RuntimeError, "not on q's main thread");
+        return NULL;
+    }
+    return PyInt_FromLong((long)release_deferred());
+}
+
+PyDoc_STRVAR(_k_is_q_thread_doc, "is_q_thread() -> bool\n\n"
+             "Return True if the calling thread may use q's C API.\n");
+static PyObject *
+_k_is_q_thread(PyObject *self)
+{
+    return PyBool_FromLong(q_thread != 0);
+}
+
+PyDoc_STRVAR(_k_is_main_thread_doc, "is_main_thread() -> bool\n\n"
+             "Return True if called on q's main thread.\n");
+static PyObject *
+_k_is_main_thread(PyObject *self)
+{
+    return PyBool_FromLong(main_thread != 0);
+}
+
+PyDoc_STRVAR(_k_memory_stats_doc, "memory_stats() -> (objects, bytes)\n\n"
+             "Return the number of live K objects and the q bytes they "
+             "reference.\n");
+static PyObject *
+_k_memory_stats(PyObject *self)
+{
+    return Py_BuildValue("LL", live_objects, live_bytes);
+}
+
+PyDoc_STRVAR(_k_alloc_stats_doc, "alloc_stats() -> dict\n\n"
+             "Return K object allocation counters.\n");
+static PyObject *
+_k_alloc_stats(PyObject *self)
+{
+    return Py_BuildValue("{sLsLsLsisi}", "allocated", nallocated,
+                         "reused", nreused, "cached", ncached,
+                         "free", numfree, "free_max", freelist_max);
+}
+
+PyDoc_STRVAR(_k_set_freelist_size_doc, "set_freelist_size(n) -> int\n\n"
+             "Set the maximum size of the K object free list.\n\n"
+             "Returns the previous maximum.\n");
+static PyObject *
+_k_set_freelist_size(PyObject *self, PyObject *arg)
+{
+    int old = freelist_max;
+    long n = PyInt_AsLong(arg);
+    if (n == -1 && PyErr_Occurred())
+        return NULL;
+    if (n < 0 || n > INT_MAX) {
+        PyErr_SetString(PyExc_ValueError, "size out of range");
+        return NULL;
+    }
+#if KOBJECT_FREELIST_MAX == 0
+    n = 0;
+#endif
+    freelist_max = (int)n;
+    while (numfree > freelist_max) {
+        KObject *op = free_list;
+        free_list = (KObject *)op->x;
+        numfree--;
+        PyObject_Free(op);
+    }
+    return PyInt_FromLong(old);
+}
+
 /* List of functions defined in the module */
 static PyMethodDef _k_methods[] = {
     {"sd0", (PyCFunction)K_sd0, METH_VARARGS, K_sd0_doc},
@@ -3974,6 +4455,18 @@ static PyMethodDef _k_methods[] = {
     {"ymd", _k_ymd, METH_VARARGS, _k_ymd_doc},
     {"dj", _k_dj, METH_VARARGS, _k_dj_doc},
     {"okx", (PyCFunction)_k_okx, METH_O, _k_okx_doc},
+    {"release_deferred", (PyCFunction)_k_release_deferred, METH_NOARGS,
+     _k_release_deferred_doc},
+    {"is_q_thread", (PyCFunction)_k_is_q_thread, METH_NOARGS,
+     _k_is_q_thread_doc},
+    {"is_main_thread", (PyCFunction)_k_is_main_thread, METH_NOARGS,
+     _k_is_main_thread_doc},
+    {"memory_stats", (PyCFunction)_k_memory_stats, METH_NOARGS,
+     _k_memory_stats_doc},
+    {"alloc_stats", (PyCFunction)_k_alloc_stats, METH_NOARGS,
+     _k_alloc_stats_doc},
+    {"set_freelist_size", (PyCFunction)_k_set_freelist_size, METH_O,
+     _k_set_freelist_size_doc},
 #if KXVER>=3
     {"m9", (PyCFunction)_k_m9, METH_NOARGS, _k_m9_doc},
     {"setm", (PyCFunction)_k_setm, METH_O, _k_setm_doc},
@@ -4359,6 +4852,13 @@ MOD_INIT(_k)
     k_repr = k(0, "-3!", (K) 0);
     k_noargs = knk(1, r1(k_none));
     debug = getenv("PYQDBG") != NULL;
+    /* _k is imported on q's main thread */
+    main_thread = q_thread = 1;
+    if (deferred_lock == NULL) {
+        deferred_lock = PyThread_allocate_lock();
+        if (deferred_lock == NULL)
+            return MOD_ERROR_VAL;
+    }
     /* trp support */
     get_backtrace_dl = dl(get_backtrace, 2);
 
@@ -4412,6 +4912,7 @@ MOD_INIT(_k)
     PyModule_AddIntMacro(m, XD);
 
     PyModule_AddIntConstant(m, "SIZEOF_VOID_P", SIZEOF_VOID_P);
+    PyModule_AddIntMacro(m, TRACEMALLOC_DOMAIN);
     PyModule_AddStringConstant(m, "__version__", __version__);
 
     x = k(0, ".z.K", (K)0);
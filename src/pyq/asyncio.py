@@ -0,0 +1,251 @@
+"""asyncio integration
+
+There are two ways to combine asyncio with kdb+.
+
+When q's main loop is in control (for example, in a q script that loads
+Python code with p)), call install().  It makes QEventLoop the default
+event loop and registers its selector with q's event loop using sd1, so
+that asyncio callbacks run whenever one of their file descriptors
+becomes ready:
+
+    q)p)import pyq.asyncio
+    q)p)loop = pyq.asyncio.install()
+
+When a Python program is in control, simply run an asyncio event loop as
+usual.  In both cases, query() sends a request to a remote q process and
+returns a future that is resolved when the remote process replies:
+
+>>> async def main(h):
+...     a, b = await asyncio.gather(query(h, 'til 3'),
+...                                 query(h, '{x+y}', 1, 2))
+...     return a, b
+>>> asyncio.get_event_loop().run_until_complete(main(h))  # doctest: +SKIP
+(k('0 1 2'), k('3'))
+"""
+from __future__ import absolute_import
+
+import asyncio
+import heapq
+import itertools
+import selectors
+import threading
+
+from . import K, q, kerr, _k
+from .ipc import _message, _flush, _receive
+
+__all__ = ['QEventLoop', 'QEventLoopPolicy', 'install', 'query']
+
+# Remote side of an asynchronous request: evaluate x and call
+# .p.areply[i;(ok;result)] back on the requesting process.
+_REQUEST = ('{[i;x]neg[.z.w](`.p.areply;i;'
+            '@[{(1b;value x)};x;{(0b;x)}])}')
+
+# request id -> (future, handle, loop)
+_pending = {}
+_ids = itertools.count()
+# handle -> number of pending requests watched with loop.add_reader
+_watched = {}
+
+
+def _resolve(i, reply):
+    try:
+        future, h, loop = _pending.pop(int(i))
+    except KeyError:
+        # The request was cancelled or timed out.
+        return None
+    if not future.done():
+        ok, r = reply
+        if ok:
+            future.set_result(r)
+        else:
+            future.set_exception(kerr(str(r)))
+    if isinstance(loop, QEventLoop):
+        loop.step()
+    return None
+
+
+def _on_readable(loop, h):
+    try:
+        msg = _receive(h)
+    except kerr:
+        loop.remove_reader(h)
+        _watched.pop(h, None)
+        for i, (future, fh, _) in list(_pending.items()):
+            if fh == h:
+                del _pending[i]
+                if not future.done():
+                    future.set_exception(kerr('close'))
+        return
+    if msg._t == 0 and len(msg) == 3 and str(msg[0]) == '.p.areply':
+        _resolve(msg[1], msg[2])
+
+
+def _unwatch(loop, h):
+    n = _watched.get(h)
+    if n is None:
+        return
+    n -= 1
+    if n:
+        _watched[h] = n
+    else:
+        del _watched[h]
+        loop.remove_reader(h)
+
+
+def query(h, m, *args, **kwds):
+    """Send m with args to the remote process h and return a future
+
+    A string m is sent as q code.  The future's result is the K object
+    returned by the remote process; a remote error is set as a kerr
+    exception.  Use asyncio.wait_for to limit the wait; a reply that
+    arrives after the future is cancelled is discarded.
+    """
+    loop = kwds.pop('loop', None) or asyncio.get_event_loop()
+    if kwds:
+        raise TypeError("unexpected keyword arguments: %s" %
+                        ', '.join(sorted(kwds)))
+    h = int(h)
+    i = next(_ids)
+    future = loop.create_future()
+    _pending[i] = future, h, loop
+    K._k(-h, _REQUEST, K._kj(i), _message(m, args))
+    _flush(h)
+    if not (isinstance(loop, QEventLoop) and loop.attached):
+        # q's main loop is not running - read the replies ourselves.
+        if h not in _watched:
+            _watched[h] = 0
+            loop.add_reader(h, _on_readable, loop, h)
+        _watched[h] += 1
+        future.add_done_callback(lambda _: _unwatch(loop, h))
+    future.add_done_callback(lambda _: _pending.pop(i, None))
+    return future
+
+
+class _Waker(threading.Thread):
+    """Wake up the event loop when its timers are due
+
+    q only calls back into the loop when the selector has ready file
+    descriptors, so timers are serviced by writing to the loop's
+    self-pipe from this thread.
+    """
+
+    def __init__(self, loop):
+        threading.Thread.__init__(self, name='pyq-asyncio-waker')
+        self.daemon = True
+        self.loop = loop
+        self.deadlines = []
+        self.cond = threading.Condition()
+        self.stopped = False
+
+    def add(self, when):
+        with self.cond:
+            heapq.heappush(self.deadlines, when)
+            if self.deadlines[0] == when:
+                self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def run(self):
+        loop = self.loop
+        with self.cond:
+            while not self.stopped:
+                if not self.deadlines:
+                    self.cond.wait()
+                    continue
+                delay = self.deadlines[0] - loop.time()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                heapq.heappop(self.deadlines)
+                try:
+                    loop.call_soon_threadsafe(lambda: None)
+                except RuntimeError:  # loop is closed
+                    break
+
+
+class QEventLoop(asyncio.SelectorEventLoop):
+    """asyncio event loop that can run inside q's main loop"""
+
+    def __init__(self, selector=None):
+        if selector is None:
+            selector = selectors.DefaultSelector()
+        self._q_selector = selector
+        self._waker = None
+        asyncio.SelectorEventLoop.__init__(self, selector)
+
+    @property
+    def attached(self):
+        return self._waker is not None
+
+    def attach(self):
+        """Register the loop with q's main loop"""
+        if self.attached:
+            return
+        try:
+            fd = self._q_selector.fileno()
+        except AttributeError:
+            raise TypeError("%s cannot be polled by q" %
+                            type(self._q_selector).__name__)
+        _k.sd1(fd, self._on_ready)
+        self._waker = _Waker(self)
+        self._waker.start()
+        # Run callbacks scheduled before the loop was attached.
+        self.step()
+
+    def detach(self):
+        """Unregister the loop from q's main loop"""
+        if not self.attached:
+            return
+        _k.sd0(self._q_selector.fileno())
+        self._waker.stop()
+        self._waker = None
+
+    def close(self):
+        self.detach()
+        asyncio.SelectorEventLoop.close(self)
+
+    def call_at(self, when, callback, *args, **kwds):
+        handle = asyncio.SelectorEventLoop.call_at(self, when, callback,
+                                                   *args, **kwds)
+        if self._waker is not None:
+            self._waker.add(when)
+        return handle
+
+    def step(self):
+        """Run one iteration of the loop without blocking
+
+        Does nothing if the loop is already running, for example, when
+        q processes an incoming message during a synchronous request
+        made from a coroutine.
+        """
+        if self.is_running() or self.is_closed():
+            return
+        self.call_soon(self.stop)
+        self.run_forever()
+
+    def _on_ready(self, fd):
+        self.step()
+
+
+class QEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """Event loop policy that creates QEventLoop instances"""
+
+    def new_event_loop(self):
+        return QEventLoop()
+
+
+def install():
+    """Make QEventLoop the default and run it inside q's main loop
+
+    Returns the event loop.
+    """
+    asyncio.set_event_loop_policy(QEventLoopPolicy())
+    loop = asyncio.get_event_loop()
+    loop.attach()
+    return loop
+
+
+q('@[`.p;`areply;:;]', _resolve)
@@ -2,6 +2,7 @@ from __future__ import absolute_import, print_function
 from __future__ import unicode_literals
 
 import cmd as _cmd
+import time
 
 from . import q, kerr, Q_OS
 
@@ -11,8 +12,11 @@ except ImportError:
     ptk = None
 
 q('.py.pcc:`s#0 5 20f!32 33 31')
-_prompt_color = q('{.py.pcc 100*(%)over system["w"]1 5}')
+_prompt_color = q('.py.pcc')
 _prompt_namespace = q('{?[ns~`.;`;ns:system"d"]}')
+# used heap peak wmax mmap mphy - unlike .Q.w, does not scan the symbols
+_memory = q('{6#system"w"}')
+_clock = getattr(time, 'perf_counter', time.time)
 if Q_OS.startswith('w'):
     def _colorize(_, prompt):
         return prompt
@@ -21,14 +25,61 @@ else:
         return "\001\033[%d;1m\002%s\001\033[0m\002" % (code, prompt)
 
 
+class Stats(object):
+    """Cached statistics for the prompt and the toolbar
+
+    Memory is sampled at most every interval seconds and after every
+    query, so that redrawing the prompt does not wait for q.  The wall
+    time and the change in used memory of the last query are recorded
+    by run().
+    """
+    interval = 1.0
+
+    def __init__(self):
+        self._memory = None
+        self._sampled = None
+        self.namespace = str(_prompt_namespace())
+        self.query_time = None
+        self.query_bytes = None
+
+    @property
+    def memory(self):
+        """used, heap, peak, wmax, mmap and mphy in bytes"""
+        if (self._memory is None or
+                _clock() - self._sampled >= self.interval):
+            self.sample()
+        return self._memory
+
+    def sample(self):
+        self._memory = [int(x) for x in _memory()]
+        self._sampled = _clock()
+
+    def run(self, line):
+        """Evaluate line in q and record the statistics"""
+        used = int(_memory()[0])
+        start = _clock()
+        try:
+            return q(line)
+        finally:
+            self.query_time = _clock() - start
+            self.sample()
+            self.query_bytes = self._memory[0] - used
+            self.namespace = str(_prompt_namespace())
+
+
 class Cmd(_cmd.Cmd, object):
     _prompt = 'q{ns})'
 
+    def __init__(self, *args, **kwds):
+        super(Cmd, self).__init__(*args, **kwds)
+        self.stats = Stats()
+
     @property
     def prompt(self):
-        code = _prompt_color()
-        prompt = self._prompt.format(ns=_prompt_namespace())
-        return _colorize(code, prompt)
+        memory = self.stats.memory
+        code = _prompt_color(100.0 * memory[1] / memory[5])
+        prompt = self._prompt.format(ns=self.stats.namespace)
+        return _colorize(int(code), prompt)
 
     def precmd(self, line):
         if line.startswith('help'):
@@ -49,7 +100,7 @@ class Cmd(_cmd.Cmd, object):
             return True
         else:
             try:
-                v = q(line)
+                v = self.stats.run(line)
             except kerr as e:
                 print("'%s" % e.args[0])
             else:
@@ -51,10 +51,17 @@ p:1024;while[0~@[system;"p ",string p;0];p+:1];-1 string p;
             line = process.stdout.readline()
             port = int(line.strip())
             c = q.hopen(port)
-            c(q('".z.pc:{exit 0}"'))  # stop server on port close
+            # stop server when this connection closes
+            c(q('".z.pc:{[h;x]if[x=h;exit 0]}[.z.w]"'))
             yield c
         finally:
             if c is not None:
                 q.hclose(c)
             process.stdout.close()
             process.wait()
+
+
+@pytest.fixture
+def kdb_port(q, kdb_server):
+    """Yields the port of the kdb_server"""
+    yield int(kdb_server(q('"system\\"p\\""')))
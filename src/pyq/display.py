@@ -0,0 +1,137 @@
+"""Size-bounded display of q tables and dictionaries in notebooks
+
+K tables and dictionaries have a _repr_html_ method that renders only
+the first and the last rows, so that displaying a table with millions
+of rows formats a few dozen of them:
+
+>>> t = q('([]a:til 1000;b:1000#`x`y)')
+>>> print(html(t, rows=4))  # doctest: +ELLIPSIS
+<table class="pyq"><thead><tr><th>a</th><th>b</th></tr></thead><tbody>
+<tr><td>0</td><td>x</td></tr>
+<tr><td>1</td><td>y</td></tr>
+<tr><td>...</td><td>...</td></tr>
+<tr><td>998</td><td>x</td></tr>
+<tr><td>999</td><td>y</td></tr>
+</tbody></table>
+<p>1000 rows &times; 2 columns</p>
+
+To browse all rows, display pages of a Pager:
+
+>>> p = Pager(t, rows=100)
+>>> len(p)
+10
+>>> p[9]  # doctest: +SKIP
+"""
+from __future__ import absolute_import
+
+try:
+    from html import escape
+except ImportError:  # Python 2
+    from cgi import escape
+
+from . import q, K
+
+__all__ = ['html', 'text', 'Pager']
+
+MAX_ROWS = 20
+
+# Convert x to a table and return (n;k;t) where n is the number of rows,
+# k the number of key columns and t the unkeyed table, or () if x cannot
+# be shown as a table.
+_as_table = q('{$[98h=type x;(count x;0;x);99h<>type x;();'
+              '98h=type key x;$[98h=type value x;'
+              '(count x;count cols key x;0!x);()];'
+              '(count x;1;flip`key`value!(key x;value x))]}')
+# Format the rows y of the table x as (columns;cells) with cells[column]
+_format = q('{f:{$[10h=type x;x;-11h=type x;string x;.Q.s1 x]};'
+            '(cols x;{[f;c]f each c}[f] each value flip x y)}')
+
+
+def _rows(cells, indices, nkeys, out):
+    for i in indices:
+        out.append('<tr>')
+        for j, column in enumerate(cells):
+            tag = 'th' if j < nkeys else 'td'
+            out.append('<%s>%s</%s>' % (tag, escape(str(column[i])), tag))
+        out.append('</tr>\n')
+
+
+def _html(x, start, rows, tail):
+    t = _as_table(x)
+    if not len(t):
+        return None
+    n, nkeys, t = int(t[0]), int(t[1]), t[2]
+    stop = min(n, start + rows)
+    if tail and n > rows:
+        head = (rows + 1) // 2
+        indices = list(range(head)) + list(range(n - rows + head, n))
+    else:
+        head = None
+        indices = list(range(start, stop))
+    columns, cells = _format(t, K._J(indices))
+    columns = [str(c) for c in columns]
+    cells = [[str(s) for s in column] for column in cells]
+    out = ['<table class="pyq"><thead><tr>']
+    out.extend('<th>%s</th>' % escape(c) for c in columns)
+    out.append('</tr></thead><tbody>\n')
+    if head is None:
+        _rows(cells, range(len(indices)), nkeys, out)
+    else:
+        _rows(cells, range(head), nkeys, out)
+        out.append('<tr>%s</tr>\n' % ('<td>...</td>' * len(columns)))
+        _rows(cells, range(head, len(indices)), nkeys, out)
+    out.append('</tbody></table>\n')
+    if head is None and (start or stop < n):
+        out.append('<p>rows %d to %d of %d</p>' % (start, stop - 1, n))
+    else:
+        out.append('<p>%d rows &times; %d columns</p>' % (n, len(columns)))
+    return ''.join(out)
+
+
+def html(x, rows=MAX_ROWS):
+    """Return HTML for the first and last rows of a table or dictionary
+
+    Returns None if x is neither.
+    """
+    return _html(x, 0, rows, True)
+
+
+def text(x, rows=MAX_ROWS):
+    """Return the console text of the first rows of x
+
+    Unlike x.show(output=str), large tables and dictionaries are cut to
+    rows rows before they are formatted.
+    """
+    if x._t in (98, 99) and q.count(x) > rows:
+        n = int(q.count(x))
+        s = q('sublist', rows, x).show(output=str)
+        return s.rstrip('\n') + '\n..\n(%d rows)\n' % n
+    return x.show(output=str)
+
+
+class Pager(object):
+    """Pages of a table or dictionary for display in a notebook"""
+
+    def __init__(self, x, rows=MAX_ROWS):
+        self.x = x
+        self.rows = rows
+
+    def __len__(self):
+        return max(1, -(-int(q.count(self.x)) // self.rows))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return _Page(self, i)
+
+
+class _Page(object):
+    def __init__(self, pager, i):
+        self.pager = pager
+        self.i = i
+
+    def _repr_html_(self):
+        x, rows = self.pager.x, self.pager.rows
+        return _html(x, self.i * rows, rows, False)
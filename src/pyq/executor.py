@@ -0,0 +1,161 @@
+"""Run q code from arbitrary Python threads
+
+q's C API may only be used on q's threads.  A QExecutor lets Python
+worker threads, for example, those of a ThreadPoolExecutor, hand q
+calls over to the q main thread:
+
+    q)p)from concurrent.futures import ThreadPoolExecutor
+    q)p)from pyq.executor import QExecutor
+    q)p)qx = QExecutor()
+    q)p)def work(n): return qx.submit(q.til, n).result().sum
+    q)p)pool = ThreadPoolExecutor(4)
+    q)p)futures = [pool.submit(work, n) for n in range(10)]
+
+Submitted calls are queued and q's main loop is woken up through a pipe
+registered with sd1.  When Python is in control of the main thread, call
+QExecutor.poll() periodically instead.
+
+K objects that are dropped on a non-q thread are not freed there; they
+are released on the main thread the next time it drops a K object or
+runs queued calls.
+"""
+from __future__ import absolute_import
+
+import collections
+import os
+import select
+import threading
+from concurrent import futures
+
+from . import _k
+
+__all__ = ['QExecutor']
+
+
+class _WorkItem:
+    def __init__(self, future, fn, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class QExecutor(futures.Executor):
+    """Executor that runs calls on q's main thread
+
+    Must be created on q's main thread.  A call submitted from the main
+    thread is run immediately, so that waiting for its result does not
+    block q's main loop.
+    """
+
+    def __init__(self):
+        if not _k.is_main_thread():
+            raise RuntimeError("QExecutor must be created on q's main "
+                               "thread")
+        # deque.append and deque.popleft are atomic, so worker threads
+        # never wait for each other or for the main thread.
+        self._queue = collections.deque()
+        self._shutdown = False
+        self._shutdown_lock = threading.Lock()
+        self._rfd, self._wfd = os.pipe()
+        for fd in (self._rfd, self._wfd):
+            _set_nonblocking(fd)
+        _k.sd1(self._rfd, self._on_ready)
+
+    def submit(self, fn, *args, **kwargs):
+        with self._shutdown_lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures "
+                                   "after shutdown")
+            item = _WorkItem(futures.Future(), fn, args, kwargs)
+            if _k.is_q_thread():
+                item.run()
+            else:
+                self._queue.append(item)
+                self._wakeup()
+        return item.future
+
+    def poll(self, timeout=0):
+        """Run queued calls, waiting up to timeout seconds for one
+
+        Use this when Python rather than q's main loop is in control of
+        the main thread.  Returns the number of calls run.  On any other
+        thread, poll only wakes up the main thread and returns 0.
+        """
+        if not _k.is_main_thread():
+            self._wakeup()
+            return 0
+        if not self._queue and timeout:
+            select.select([self._rfd], [], [], timeout)
+        self._drain()
+        return self._run_pending()
+
+    def shutdown(self, wait=True):
+        with self._shutdown_lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+        if _k.is_main_thread():
+            self._close()
+        else:
+            # The pipe can only be unregistered on the main thread.
+            item = _WorkItem(futures.Future(), self._close, (), {})
+            self._queue.append(item)
+            self._wakeup()
+            if wait:
+                item.future.result()
+
+    def _wakeup(self):
+        try:
+            os.write(self._wfd, b'\0')
+        except OSError:
+            # The pipe is full - the main thread will be woken up anyway.
+            pass
+
+    def _drain(self):
+        try:
+            while os.read(self._rfd, 4096):
+                pass
+        except OSError:
+            # EAGAIN - the pipe is empty.
+            pass
+
+    def _on_ready(self, fd):
+        self._drain()
+        self._run_pending()
+
+    def _run_pending(self):
+        _k.release_deferred()
+        n = 0
+        while True:
+            try:
+                item = self._queue.popleft()
+            except IndexError:
+                return n
+            item.run()
+            n += 1
+
+    def _close(self):
+        if self._rfd is None:
+            return
+        self._run_pending()
+        _k.sd0(self._rfd)
+        os.close(self._rfd)
+        os.close(self._wfd)
+        self._rfd = self._wfd = None
+
+
+def _set_nonblocking(fd):
+    import fcntl
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
@@ -0,0 +1,190 @@
+"""Read splayed tables on disk without loading them into q
+
+MappedTable maps the column files of a splayed table with mmap and
+exposes the columns as read-only numpy arrays that share memory with
+the page cache:
+
+>>> db = getfixture('tmpdir')
+>>> _ = q('{.Q.dd[x;`t`]set .Q.en[x]y}', q.hsym(db.strpath),
+...       q('([]a:1 2 3;b:1 2 3f;s:`x`y`x)'))
+>>> t = MappedTable(db.join('t').strpath)
+>>> t.columns
+['a', 'b', 's']
+>>> t['a']
+array([1, 2, 3])
+>>> t.decode('s')
+array(['x', 'y', 'x'], dtype=object)
+
+Data is exposed as stored by q: enumerated columns hold int32 indices
+into the enumeration domain (see decode), and temporal columns hold
+integer counts from q's epoch (2000.01.01), except for timespans, which
+are mapped as numpy timedelta64[ns].  Use MappedTable.k to read a column
+as a K object with q's get.
+
+To scan a partitioned database, map each partition's table directory,
+for example, db/2020.01.01/trade.
+"""
+from __future__ import absolute_import
+
+import mmap
+import os
+import struct
+
+import numpy
+
+from . import q
+
+__all__ = ['MappedTable']
+
+HEADER_SIZE = 16
+_MAGIC = (b'\xff\x01', b'\xfe\x20')
+_COMPRESSED = b'kxzipped'
+
+_DTYPES = {
+    1: '?',     # boolean
+    2: 'u1',    # guid - 16 bytes per item
+    4: 'u1',    # byte
+    5: '<i2',   # short
+    6: '<i4',   # int
+    7: '<i8',   # long
+    8: '<f4',   # real
+    9: '<f8',   # float
+    10: 'S1',   # char
+    12: '<i8',  # timestamp
+    13: '<i4',  # month
+    14: '<i4',  # date
+    15: '<f8',  # datetime
+    16: '<m8[ns]',  # timespan
+    17: '<i4',  # minute
+    18: '<i4',  # second
+    19: '<i4',  # time
+}
+# types 20 through 76 are enumerations
+_ENUM_DTYPE = '<i4'
+
+
+def _map(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _header(m, path):
+    if m[:len(_COMPRESSED)] == _COMPRESSED:
+        raise ValueError("%s: compressed files cannot be mapped" % path)
+    if len(m) < HEADER_SIZE or m[:2] not in _MAGIC:
+        raise ValueError("%s: not a q data file" % path)
+    t, attr = struct.unpack_from('<bB', m, 2)
+    n, = struct.unpack_from('<q', m, 8)
+    return t, attr, n
+
+
+def _read_symbols(path):
+    m = _map(path)
+    try:
+        t, _, n = _header(m, path)
+        if t != 11:
+            raise ValueError("%s: expected a symbol list, got type %d" %
+                             (path, t))
+        data = m[HEADER_SIZE:].split(b'\0')[:n]
+    finally:
+        m.close()
+    return [s.decode('utf-8') for s in data]
+
+
+class MappedTable(object):
+    """Splayed table with columns mapped as numpy arrays
+
+    Columns are mapped on first access.  Nested columns (such as
+    strings) cannot be mapped; read them with MappedTable.k instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = _read_symbols(os.path.join(path, '.d'))
+        self._arrays = {}
+        self._types = {}
+        self._domains = {}
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.path)
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(self[self.columns[0]])
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        try:
+            return self._arrays[name]
+        except KeyError:
+            pass
+        if name not in self.columns:
+            raise KeyError(name)
+        path = os.path.join(self.path, name)
+        m = _map(path)
+        t, _, n = _header(m, path)
+        if 20 <= t < 77:
+            dtype = _ENUM_DTYPE
+        elif t in _DTYPES:
+            dtype = _DTYPES[t]
+        else:
+            m.close()
+            raise TypeError("column %s of type %d cannot be mapped" %
+                            (name, t))
+        if t == 2:
+            a = numpy.frombuffer(m, dtype, 16 * n,
+                                 HEADER_SIZE).reshape(n, 16)
+        else:
+            a = numpy.frombuffer(m, dtype, n, HEADER_SIZE)
+        self._arrays[name] = a
+        self._types[name] = t
+        return a
+
+    def keys(self):
+        return list(self.columns)
+
+    def type(self, name):
+        """Return q's type code of the column name"""
+        self[name]
+        return self._types[name]
+
+    def decode(self, name, domain=None):
+        """Return the symbols of an enumerated column as an object array
+
+        The domain defaults to the sym file in the database root, which
+        is looked up in the parent directories of the table.
+        """
+        a = self[name]
+        if not 20 <= self._types[name] < 77:
+            raise TypeError("column %s is not enumerated" % name)
+        if domain is None:
+            domain = self._find_domain('sym')
+        try:
+            symbols = self._domains[domain]
+        except KeyError:
+            symbols = numpy.array(_read_symbols(domain), dtype=object)
+            self._domains[domain] = symbols
+        return symbols[a]
+
+    def k(self, name):
+        """Read the column name as a K object using q's get"""
+        if name not in self.columns:
+            raise KeyError(name)
+        return q.get(q.hsym(os.path.join(self.path, name)))
+
+    def _find_domain(self, name):
+        d = os.path.abspath(self.path)
+        # table directory, partition directory and database root
+        for _ in range(3):
+            d = os.path.dirname(d)
+            path = os.path.join(d, name)
+            if os.path.isfile(path):
+                return path
+        raise ValueError("cannot find the %s file for %s" %
+                         (name, self.path))
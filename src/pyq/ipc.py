@@ -0,0 +1,617 @@
+"""Connections to remote kdb+ processes
+
+This module provides a pool of IPC connections that are opened with q's
+hopen and closed with hclose.  Handles returned by the pool are ordinary
+K integers that can be called directly or passed to K._k.
+
+>>> pool = ConnectionPool(max_size=4, idle_timeout=60)
+>>> with pool.connection('localhost:5001') as h:  # doctest: +SKIP
+...     h(kp('til 3'))
+k('0 1 2')
+
+Queries to several processes can be sent concurrently with gather,
+which waits only as long as the slowest of them
+
+>>> gather([(h1, 'count trade', ()),
+...         (h2, '{select from x}', ('quote',))])  # doctest: +SKIP
+[k('1000'), k('+`sym`bid`ask!(..)')]
+
+Note that the pool bookkeeping is thread-safe, but the q C API is not:
+queries should still be sent from the q main thread.
+"""
+from __future__ import absolute_import
+
+import itertools
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import K, q, kp, kerr, _k
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+__metaclass__ = type
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+# Prefixes of q error messages that indicate a broken connection.
+_CONNECTION_ERRORS = ('close', 'rcv.', 'snd.', 'Cannot write to handle')
+
+
+class ReplyTimeout(kerr):
+    """a reply did not arrive in time
+
+    The late reply is still pending on the connection, so the connection
+    cannot be used for further requests.
+    """
+
+
+def is_connection_error(e):
+    """Return True if exception e signals a broken connection"""
+    if isinstance(e, (OSError, IOError, ReplyTimeout)):
+        return True
+    if isinstance(e, kerr) and e.args:
+        return str(e.args[0]).startswith(_CONNECTION_ERRORS)
+    return False
+
+
+def address_key(address):
+    """Normalize address to the host:port form
+
+    >>> address_key(5001)
+    'localhost:5001'
+    >>> address_key(':example.com:5001')
+    'example.com:5001'
+    >>> address_key('`:example.com:5001:user:pass')
+    'example.com:5001:user:pass'
+    """
+    if isinstance(address, int):
+        return 'localhost:%d' % address
+    address = str(address).lstrip('`').lstrip(':')
+    if address.isdigit():
+        address = 'localhost:' + address
+    return address
+
+
+def hopen(address, timeout=0):
+    """Open a connection to address and return the handle"""
+    return q('{hopen(hsym x;y)}', address_key(address), timeout)
+
+
+def hclose(h):
+    """Close handle h ignoring errors from already closed handles"""
+    try:
+        q.hclose(h)
+    except kerr:
+        pass
+
+
+def _alive(h):
+    """Check that an idle handle has not been closed by the peer
+
+    A socket closed by the peer becomes readable (EOF), so an idle
+    connection that selects as readable is not usable.
+    """
+    try:
+        readable = select.select([int(h)], [], [], 0)[0]
+    except (OSError, IOError, ValueError, select.error):
+        # Handles are not file descriptors on this platform -
+        # fall back to a round trip.
+        try:
+            h(kp('::'))
+        except kerr:
+            return False
+        return True
+    return not readable
+
+
+# Remote side of the deferred synchronous protocol: evaluate the request
+# and send back (ok; result) asynchronously on the same connection.
+_DEFERRED = '{neg[.z.w]@[{(1b;value x)};x;{(0b;x)}]}'
+_flush = q('{neg[x][]}')
+_receive = q('{x[]}')
+
+
+def _message(m, args):
+    if isinstance(m, string_types):
+        m = kp(m)
+    if not args:
+        return m
+    return K._K([m] + [K(a) for a in args])
+
+
+def _wait(h, timeout):
+    """Wait for up to timeout seconds for a message on h"""
+    try:
+        readable = select.select([h], [], [], max(0, timeout))[0]
+    except (OSError, IOError, ValueError, select.error):
+        # Cannot select on handles - block in h[] instead.
+        return True
+    return bool(readable)
+
+
+def gather(requests, timeout=None):
+    """Send requests to remote processes and return the results in order
+
+    Each request is a tuple (handle, query, args) with an optional fourth
+    element giving the timeout for that request in seconds.  Requests
+    without their own timeout use the timeout argument.
+
+    All requests are sent asynchronously before any reply is read, so the
+    remote processes work in parallel and the total wait is close to the
+    latency of the slowest one.  If any request fails or times out, the
+    remaining replies are still collected and the first error is raised.
+
+    A timeout raises ReplyTimeout.  The connection is left open, but a
+    late reply would be mistaken for the reply to the next request, so
+    the caller must close it.  ConnectionPool.connection discards it.
+    """
+    start = time.time()
+    pending = []
+    for r in requests:
+        h, m = int(r[0]), r[1]
+        args = r[2] if len(r) > 2 else ()
+        t = r[3] if len(r) > 3 else timeout
+        K._k(-h, _DEFERRED, _message(m, args))
+        pending.append((h, t))
+    for h in set(h for h, _ in pending):
+        _flush(h)
+
+    results = []
+    error = None
+    timed_out = set()
+    for h, t in pending:
+        r = None
+        try:
+            if h in timed_out:
+                raise ReplyTimeout('timeout')
+            if t is not None and not _wait(h, start + t - time.time()):
+                timed_out.add(h)
+                raise ReplyTimeout('timeout')
+            ok, r = _receive(h)
+            if not ok:
+                raise kerr(str(r))
+        except kerr as e:
+            if error is None:
+                error = e
+        results.append(r)
+    if error is not None:
+        raise error
+    return results
+
+
+# Remote helpers for fetch.  The result is kept in a variable in the .pyq
+# namespace named after the requesting handle and a request number.
+_FETCH_OPEN = ('{[i;n;x]r:value x;if[n>=count r;:(0b;r)];'
+               '(`$".pyq.r",string[.z.w],"_",string i)set r;(1b;count r)}')
+_FETCH_NEXT = ('{[i;s;n;z]r:(s;n)sublist get`$".pyq.r",string[.z.w],"_",'
+               'string i;$[z;-18!r;r]}')
+_FETCH_CLOSE = ('{[i]![`.pyq;();0b;enlist`$"r",string[.z.w],"_",'
+                'string i];}')
+_fetch_ids = itertools.count()
+_decompress = q('-9!')
+
+
+def fetch(h, m, args=(), chunk_rows=100000, compress=False):
+    """Execute m with args at h and yield the result in chunks
+
+    If the result has more than chunk_rows items (rows of a table),
+    the remote process keeps it and sends it back chunk_rows rows at a
+    time, so neither side has to serialize the whole result at once.
+    Smaller results are returned in a single chunk.
+
+    If compress is true, chunks are compressed by the remote process
+    with -18! even if the connection would not use IPC compression
+    (for example, on localhost).
+
+    >>> for chunk in fetch(h, 'select from trade'):  # doctest: +SKIP
+    ...     process(chunk)
+    """
+    h = int(h)
+    i = next(_fetch_ids)
+    paged, r = K._k(h, _FETCH_OPEN, K._kj(i), K._kj(chunk_rows),
+                    _message(m, args))
+    if not paged:
+        yield r
+        return
+    n = int(r)
+    try:
+        for start in range(0, n, chunk_rows):
+            chunk = K._k(h, _FETCH_NEXT, K._kj(i), K._kj(start),
+                         K._kj(chunk_rows), K._kb(compress))
+            if compress:
+                chunk = _decompress(chunk)
+            yield chunk
+    finally:
+        K._k(h, _FETCH_CLOSE, K._kj(i))
+
+
+class ConnectionPool:
+    """a thread-safe pool of connections to remote kdb+ processes
+
+    Connections are keyed by address ('host:port'). At most max_size
+    connections are open for each address.  Connections that stayed idle
+    for longer than idle_timeout seconds are closed instead of being
+    reused.  Idle connections are checked before they are handed out and
+    replaced if the peer has closed them.
+    """
+
+    def __init__(self, max_size=8, idle_timeout=None, timeout=0):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._lock = threading.Condition(threading.Lock())
+        # address -> list of (handle, time released)
+        self._idle = defaultdict(list)
+        # address -> number of open connections (idle and in use)
+        self._open = defaultdict(int)
+        self._closed = False
+
+    def __repr__(self):
+        return '<%s max_size=%d open=%d>' % (
+            type(self).__name__, self.max_size, sum(self._open.values()))
+
+    def acquire(self, address, wait=None):
+        """Return a connection handle for address
+
+        If max_size connections to address are already in use, block for
+        up to wait seconds (forever if wait is None) for one of them to
+        be released.
+        """
+        key = address_key(address)
+        deadline = None if wait is None else time.time() + wait
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise ValueError("pool is closed")
+                h = self._pop_idle(key)
+                if h is not None:
+                    return h
+                if self._open[key] < self.max_size:
+                    self._open[key] += 1
+                    break
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise kerr('timeout')
+                self._lock.wait(remaining)
+        try:
+            return hopen(key, self.timeout)
+        except Exception:
+            self._forget(key)
+            raise
+
+    def release(self, address, h, discard=False):
+        """Return connection h to the pool
+
+        If discard is true, the connection is closed instead.
+        """
+        key = address_key(address)
+        if discard or self._closed:
+            hclose(h)
+            self._forget(key)
+            return
+        with self._lock:
+            self._idle[key].append((h, time.time()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, address, wait=None):
+        """Context manager that acquires and releases a connection
+
+        The connection is discarded if the block raises a connection
+        error.
+        """
+        h = self.acquire(address, wait)
+        try:
+            yield h
+        except Exception as e:
+            self.release(address, h, discard=is_connection_error(e))
+            raise
+        else:
+            self.release(address, h)
+
+    def call(self, address, m, *args, **kwds):
+        """Execute m with args at address and return the result
+
+        A string m is sent as q code.  If the connection turns out to be
+        broken, reconnect and retry up to retries times (once by default).
+        """
+        retries = kwds.pop('retries', 1)
+        wait = kwds.pop('wait', None)
+        if kwds:
+            raise TypeError("unexpected keyword arguments: %s" %
+                            ', '.join(sorted(kwds)))
+        if isinstance(m, string_types):
+            m = kp(m)
+        while True:
+            try:
+                with self.connection(address, wait) as h:
+                    return h(m, *args)
+            except Exception as e:
+                if retries > 0 and is_connection_error(e):
+                    retries -= 1
+                    continue
+                raise
+
+    def close(self):
+        """Close all idle connections and refuse new requests
+
+        Connections that are in use are closed when they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, defaultdict(list)
+            for key, handles in idle.items():
+                self._open[key] -= len(handles)
+            self._lock.notify_all()
+        for handles in idle.values():
+            for h, _ in handles:
+                hclose(h)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _pop_idle(self, key):
+        # Must be called with self._lock held.
+        idle = self._idle[key]
+        now = time.time()
+        while idle:
+            h, released = idle.pop()
+            if ((self.idle_timeout is None or
+                 now - released < self.idle_timeout) and _alive(h)):
+                return h
+            hclose(h)
+            self._open[key] -= 1
+        return None
+
+    def _forget(self, key):
+        with self._lock:
+            self._open[key] -= 1
+            self._lock.notify()
+
+
+class _Timer(threading.Thread):
+    """Run a callback on q's main thread at a given time
+
+    The thread writes to a pipe that is registered with q's event loop
+    (sd1), so the callback runs while q's main loop is idle.  Nothing
+    runs while Python is in control of the main thread.
+    """
+
+    def __init__(self, callback):
+        threading.Thread.__init__(self, name='pyq-publisher-timer')
+        self.daemon = True
+        self.callback = callback
+        self.deadline = None
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.rfd, self.wfd = os.pipe()
+        for fd in (self.rfd, self.wfd):
+            fl = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+        _k.sd1(self.rfd, self._on_ready)
+
+    def schedule(self, when):
+        """Run the callback at time when unless it is due earlier"""
+        with self.cond:
+            if self.deadline is None or when < self.deadline:
+                self.deadline = when
+                self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        if self.is_alive():
+            self.join()
+        try:
+            _k.sd0(self.rfd)
+        except ValueError:
+            pass  # q removed the callback after an error
+        os.close(self.rfd)
+        os.close(self.wfd)
+
+    def run(self):
+        with self.cond:
+            while not self.stopped:
+                if self.deadline is None:
+                    self.cond.wait()
+                    continue
+                delay = self.deadline - time.time()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                self.deadline = None
+                try:
+                    os.write(self.wfd, b'\0')
+                except OSError:
+                    pass  # the pipe is full - a wake up is pending
+
+    def _on_ready(self, fd):
+        try:
+            while os.read(fd, 512):
+                pass
+        except OSError:
+            pass
+        self.callback()
+
+
+def _column(x):
+    # A one-item q list that _ja can extend with values like x.
+    return q('enlist', x)
+
+
+# Types of vectors that K._ja can extend with Python values
+_JA_TYPES = (1, 4, 5, 6, 7, 8, 9, 10, 11)
+
+
+def _append(column, x):
+    t = column._t
+    if t == 0:
+        column._ja(K(x))
+    elif t in _JA_TYPES:
+        column._ja(x)
+    else:
+        y = _column(x)
+        if y._t != t:
+            raise TypeError("cannot append %s to a column of type %d" %
+                            (type(x).__name__, t))
+        column._jv(y)
+
+
+class Publisher:
+    """batching publisher of asynchronous updates
+
+    Rows published to a table are appended to q column vectors and sent
+    to the remote process as a single asynchronous message
+
+        neg[h](func; table; columns)
+
+    once max_rows rows are pending for the table or max_delay seconds
+    have passed since the oldest pending row was published.  func
+    defaults to the tickerplant's .u.upd.  The column types are taken
+    from the first pending row.
+
+    The delay is checked on each call to publish and, while q's main
+    loop is running, by a timer.  When Python is in control of q's main
+    thread, call flush() when publishing stops.
+
+    >>> pub = Publisher(h, max_rows=1000)  # doctest: +SKIP
+    >>> pub.publish('trade', ('IBM', 101.5, 100))  # doctest: +SKIP
+    >>> pub.flush()  # doctest: +SKIP
+    """
+
+    def __init__(self, h, func='.u.upd', max_rows=1000, max_delay=0.1):
+        self.h = int(h)
+        self.func = func
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        # table -> list of q column vectors
+        self._buffers = {}
+        # table -> time of the oldest pending row
+        self._since = {}
+        self._timer = None
+        self._flushes = 0
+        self.message_count = 0
+        self.row_count = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    @property
+    def queue_depth(self):
+        """number of rows waiting to be sent"""
+        return sum(len(b[0]) for b in self._buffers.values())
+
+    def publish(self, table, row):
+        """Queue one row (a sequence of column values) for table"""
+        buffers = self._buffers.get(table)
+        if buffers is None:
+            buffers = [_column(x) for x in row]
+            if not buffers:
+                raise ValueError("empty row")
+            self._buffers[table] = buffers
+            self._since[table] = time.time()
+            self._schedule(table)
+        else:
+            if len(row) != len(buffers):
+                raise ValueError("expected %d columns, got %d" %
+                                 (len(buffers), len(row)))
+            for i, x in enumerate(row):
+                try:
+                    _append(buffers[i], x)
+                except Exception:
+                    # Keep the columns aligned.
+                    for j in range(i):
+                        buffers[j] = q('-1_', buffers[j])
+                    raise
+        if len(buffers[0]) >= self.max_rows:
+            self.flush(table)
+        else:
+            self._flush_expired()
+
+    def publish_many(self, table, rows):
+        """Queue several rows for table"""
+        for row in rows:
+            self.publish(table, row)
+
+    def flush(self, table=None):
+        """Send the pending rows for table (all tables if None)"""
+        tables = list(self._buffers) if table is None else [table]
+        start = time.time()
+        sent = 0
+        for t in tables:
+            buffers = self._buffers.pop(t, None)
+            if buffers is None:
+                continue
+            del self._since[t]
+            K._k(-self.h, self.func, K._ks(t), K._K(buffers))
+            self.row_count += len(buffers[0])
+            sent += 1
+        if sent:
+            _flush(self.h)
+            self.message_count += sent
+            self._flushes += 1
+            self.last_flush_latency = time.time() - start
+            self.total_flush_latency += self.last_flush_latency
+
+    def stats(self):
+        """Return a dict with queue depth and flush statistics
+
+        message_count is the number of update messages sent (one per
+        table per flush) and row_count the number of rows in them.
+        """
+        return dict(queue_depth=self.queue_depth,
+                    message_count=self.message_count,
+                    row_count=self.row_count,
+                    last_flush_latency=self.last_flush_latency,
+                    mean_flush_latency=(self.total_flush_latency /
+                                        self._flushes
+                                        if self._flushes else 0.0))
+
+    def close(self):
+        """Send the pending rows and stop the timer"""
+        try:
+            self.flush()
+        finally:
+            if self._timer is not None:
+                self._timer.stop()
+                self._timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _schedule(self, table):
+        if self.max_delay <= 0 or fcntl is None:
+            return
+        if self._timer is None:
+            self._timer = _Timer(self._on_timer)
+            self._timer.start()
+        self._timer.schedule(self._since[table] + self.max_delay)
+
+    def _flush_expired(self):
+        now = time.time()
+        for t, since in list(self._since.items()):
+            if now - since >= self.max_delay:
+                self.flush(t)
+
+    def _on_timer(self):
+        self._flush_expired()
+        for t in self._since:
+            self._schedule(t)
@@ -1,13 +1,25 @@
 from __future__ import absolute_import
+from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
+import codecs
+import errno
 import io
 import os
+import select
+import threading
 from tempfile import mkstemp
 import pyq
 from io import StringIO
 from getopt import getopt
+import math
 import sys
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 STD_STREAM = [sys.stdin, sys.stdout, sys.stderr]
 
@@ -18,6 +30,8 @@ except NameError:
     string_types = (str,)
 
 Q_NONE = pyq.q('::')
+_USED = pyq.kp('first system"w"')  # used heap bytes - cheaper than .Q.w
+_clock = getattr(time, 'perf_counter', time.time)
 
 
 def logical_lines(lines):
@@ -37,13 +51,182 @@ def logical_lines(lines):
         yield chunk
 
 
-def forward_outputs(outs):
-    for fd in (1, 2):
-        if fd in outs:
-            os.lseek(fd, 0, os.SEEK_SET)
-            with io.open(fd, closefd=False) as f:
-                STD_STREAM[fd].writelines(f)
-            os.ftruncate(fd, 0)
+def _target(fd, saved):
+    """Return the stream that receives q's output to fd
+
+    Outside a notebook, the Python stream writes to fd itself, which is
+    redirected while q's output is captured, so write to the saved
+    descriptor instead.
+    """
+    stream = STD_STREAM[fd]
+    try:
+        same = stream.fileno() == fd
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        same = False
+    if same:
+        encoding = getattr(stream, 'encoding', None) or 'utf-8'
+        stream = io.open(saved, 'w', encoding=encoding, errors='replace',
+                         closefd=False)
+    return stream
+
+
+class FileOutput(object):
+    """Capture what q writes to fd in a temporary file
+
+    Used where pipes cannot be opened by name (no /dev/fd).
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.saved = os.dup(fd)
+        self.stream = _target(fd, self.saved)
+        tmpfd, tmpfile = mkstemp()
+        try:
+            pyq.q(r'\%d %s' % (fd, tmpfile))
+        finally:
+            os.unlink(tmpfile)
+            os.close(tmpfd)
+
+    def drain(self):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        with io.open(self.fd, closefd=False) as f:
+            self.stream.writelines(f)
+        self.stream.flush()
+        os.ftruncate(self.fd, 0)
+        os.lseek(self.fd, 0, os.SEEK_SET)
+
+    def close(self):
+        self.drain()
+        os.dup2(self.saved, self.fd)
+        if self.stream is not STD_STREAM[self.fd]:
+            self.stream.close()
+        os.close(self.saved)
+
+
+class PipeOutput(object):
+    """Stream what q writes to fd through a pipe
+
+    A reader thread forwards the output to the Python stream as it is
+    produced; q releases the GIL while it runs, so the thread keeps up
+    with long running queries.  drain() forwards everything written so
+    far.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.lock = threading.Lock()
+        self.saved = os.dup(fd)
+        self.stream = _target(fd, self.saved)
+        self.rfd, wfd = os.pipe()
+        try:
+            pyq.q(r'\%d /dev/fd/%d' % (fd, wfd))
+        except pyq.kerr:
+            os.close(self.rfd)
+            os.close(self.saved)
+            raise
+        finally:
+            os.close(wfd)
+        fl = fcntl.fcntl(self.rfd, fcntl.F_GETFL)
+        fcntl.fcntl(self.rfd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        eof = False
+        while not eof:
+            select.select([self.rfd], [], [])
+            with self.lock:
+                eof = self._forward()
+
+    def _forward(self):
+        """Forward the available output, return True at end of file"""
+        while True:
+            try:
+                data = os.read(self.rfd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return False
+                raise
+            if not data:
+                return True
+            self.stream.write(self.decoder.decode(data))
+            self.stream.flush()
+
+    def drain(self):
+        with self.lock:
+            self._forward()
+
+    def close(self):
+        # Restoring fd closes q's end of the pipe, the thread sees EOF.
+        os.dup2(self.saved, self.fd)
+        self.thread.join()
+        os.close(self.rfd)
+        if self.stream is not STD_STREAM[self.fd]:
+            self.stream.close()
+        os.close(self.saved)
+
+
+def capture_output(fd):
+    """Redirect q's stdout (1) or stderr (2) to the Python stream"""
+    if fcntl is not None and os.path.isdir('/dev/fd'):
+        return PipeOutput(fd)
+    return FileOutput(fd)
+
+
+def _format_time(t):
+    for unit, scale in [('s', 1), ('ms', 1e3), ('us', 1e6)]:
+        if t >= 1 / scale:
+            break
+    else:
+        unit, scale = 'ns', 1e9
+    return '%.3g %s' % (t * scale, unit)
+
+
+def _format_bytes(n, sign=''):
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(n) < 1024 or unit == 'GiB':
+            break
+        n /= 1024
+    return ('{0:%s.4g} {1}' % sign).format(n, unit)
+
+
+def _hopen(address):
+    """Open a handle to host:port"""
+    return pyq.q.hopen(pyq.K(str(':' + address)))
+
+
+def timed(h, call, repeat=1):
+    """Call call() repeat times and return (result, report)
+
+    The report has the wall time and the change in q's used heap on
+    the host of the handle h (0 for local), and the size of the result
+    in q's serialized form.
+    """
+    used = int(h(_USED))
+    times = []
+    for _ in range(repeat):
+        start = _clock()
+        r = call()
+        times.append(_clock() - start)
+    delta = int(h(_USED)) - used
+    if repeat == 1:
+        report = _format_time(times[0])
+    else:
+        mean = sum(times) / repeat
+        std = math.sqrt(sum((t - mean) ** 2 for t in times) / repeat)
+        report = "%s +- %s (mean +- std of %d runs, best %s)" % (
+            _format_time(mean), _format_time(std), repeat,
+            _format_time(min(times)))
+    report += ", heap %s" % _format_bytes(delta, '+')
+    try:
+        size = int(pyq.q('-22!', r))
+    except pyq.kerr:
+        pass
+    else:
+        report += ", result %s" % _format_bytes(size)
+    return r, report
 
 
 def q(line, cell=None, _ns=None):
@@ -55,6 +238,9 @@ def q(line, cell=None, _ns=None):
        -o var - send output to a variable named var.
        -i var1,..,varN - input variables
        -1/-2 - redirect stdout/stderr
+       -t - report the wall time, heap change and result size of each
+            logical line
+       -r N - run each logical line N times (implies -t)
     """
     if cell is None:
         return pyq.q(line)
@@ -64,14 +250,22 @@ def q(line, cell=None, _ns=None):
     input = output = None
     preload = []
     outs = {}
+    repeat = 0
+    h = pyq.q('0i')
     try:
-        h = pyq.q('0i')
         if line:
-            for opt, value in getopt(line.split(), "h:l:o:i:12")[0]:
-                if opt == '-l':
+            for opt, value in getopt(line.split(), "h:l:o:i:12tr:")[0]:
+                if opt == '-t':
+                    repeat = repeat or 1
+                elif opt == '-r':
+                    repeat = _repeat(value)
+                    if repeat is None:
+                        print("Usage: %%q -r N (N >= 1)")
+                        return
+                elif opt == '-l':
                     preload.append(value)
                 elif opt == '-h':
-                    h = pyq.K(str(':' + value))
+                    h = _hopen(value)
                 elif opt == '-o':
                     output = str(value)  # (see #673)
                 elif opt == '-i':
@@ -82,31 +276,26 @@ def q(line, cell=None, _ns=None):
             if int(h) != 0:
                 raise ValueError("Cannot redirect remote std stream")
             for fd in outs:
-                tmpfd, tmpfile = mkstemp()
-                try:
-                    pyq.q(r'\%d %s' % (fd, tmpfile))
-                finally:
-                    os.unlink(tmpfile)
-                    os.close(tmpfd)
+                outs[fd] = capture_output(fd)
         r = None
         for script in preload:
             h(pyq.kp(r"\l " + script))
-        if input is not None:
-            for chunk in logical_lines(cell):
+        for num, chunk in enumerate(logical_lines(cell), 1):
+            if input is not None:
                 func = "{[%s]%s}" % (';'.join(input), chunk)
-                args = tuple(_ns[i] for i in input)
-                if r != Q_NONE:
-                    r.show()
-                r = h((pyq.kp(func),) + args)
-                if outs:
-                    forward_outputs(outs)
-        else:
-            for chunk in logical_lines(cell):
-                if r != Q_NONE:
-                    r.show()
-                r = h(pyq.kp(chunk))
-                if outs:
-                    forward_outputs(outs)
+                args = (pyq.kp(func),) + tuple(_ns[i] for i in input)
+            else:
+                args = pyq.kp(chunk)
+            if r != Q_NONE:
+                r.show()
+            if repeat:
+                r, report = timed(h, lambda: h(args), repeat)
+            else:
+                r = h(args)
+            for out in outs.values():
+                out.drain()
+            if repeat:
+                print("[%d] %s" % (num, report))
     except pyq.kerr as e:
         print("'%s" % e)
     else:
@@ -118,15 +307,80 @@ def q(line, cell=None, _ns=None):
         else:
             if r != Q_NONE:
                 return r
+    finally:
+        for out in outs.values():
+            if out is not None:
+                out.close()
+        if int(h):
+            pyq.q.hclose(h)
+
+
+def _leading_options(line, names):
+    """Split the options named in names off the start of line
+
+    Returns (options, code).  Parsing stops at the first token that is
+    not one of names, or after --, so that code starting with - such as
+    -1"x" is left alone.
+    """
+    opts = {}
+    code = line.strip()
+    while True:
+        parts = code.split(None, 2)
+        if parts and parts[0] == '--':
+            return opts, code[2:].strip()
+        if len(parts) < 2 or parts[0] not in names:
+            return opts, code
+        opts[parts[0]] = parts[1]
+        code = parts[2] if len(parts) > 2 else ''
+
+
+def _repeat(value):
+    """Parse the -r option; return None unless it is a count >= 1"""
+    try:
+        n = int(value)
+    except ValueError:
+        return None
+    return n if n >= 1 else None
+
+
+def qtime(line, _ns=None):
+    """Time a line of q code and return its result.
+
+    Usage: %qtime [-r N] [-h host:port] [--] code
+
+    Reports the wall time, the change in q's used heap and the result
+    size.  With -r, the code runs N times.
+    """
+    opts, code = _leading_options(line, ['-r', '-h'])
+    repeat = _repeat(opts.get('-r', 1))
+    if repeat is None:
+        print("Usage: %qtime [-r N] [-h host:port] [--] code (N >= 1)")
+        return
+    host = opts.get('-h')
+    h = pyq.q('0i')
+    try:
+        if host is not None:
+            h = _hopen(host)
+        r, report = timed(h, lambda: h(pyq.kp(code)), repeat)
+    except pyq.kerr as e:
+        print("'%s" % e)
+    else:
+        print(report)
+        if r != Q_NONE:
+            return r
+    finally:
+        if int(h):
+            pyq.q.hclose(h)
 
 
 def _q_formatter(x, p, _):
-    x_show = x.show(output=str)
-    p.text(x_show.strip())
+    from .display import text
+    p.text(text(x).strip())
 
 
 def load_ipython_extension(ipython):
     ipython.register_magic_function(q, 'line_cell')
+    ipython.register_magic_function(qtime, 'line')
     fmr = ipython.display_formatter.formatters['text/plain']
     fmr.for_type(pyq.K, _q_formatter)
 
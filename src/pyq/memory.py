@@ -0,0 +1,89 @@
+"""Memory used by q objects referenced from Python
+
+Every K object is charged for the q memory it references: its own
+header and data and, for tables and dictionaries, their columns.  A q
+object referenced by several K objects is charged to each of them, so
+the byte total is an upper bound.  The totals are available at any
+time:
+
+>>> x = q.til(1000)
+>>> s = stats()
+>>> s['objects'] > 0 and s['bytes'] >= 8000
+True
+
+To find the Python code that holds on to q memory, start tracing
+before the objects are created and take a snapshot later.  The snapshot
+is a tracemalloc.Snapshot that contains only K objects, with the sizes
+of the q memory they reference (this requires Python 3.7 or later):
+
+    pyq.memory.start(10)
+    ...
+    for stat in pyq.memory.snapshot().statistics('lineno')[:10]:
+        print(stat)
+"""
+from __future__ import absolute_import
+
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from . import q, _k
+
+__all__ = ['stats', 'alloc_stats', 'start', 'stop', 'snapshot']
+
+DOMAIN = _k.TRACEMALLOC_DOMAIN
+
+
+def stats():
+    """Return memory statistics as a dict
+
+    objects and bytes are the number of live K objects and the q bytes
+    they reference; the remaining entries are from q's .Q.w[].
+    """
+    objects, nbytes = _k.memory_stats()
+    r = {'objects': objects, 'bytes': nbytes}
+    w = q('.Q.w[]')
+    for key in w.key:
+        r[str(key)] = int(w[key])
+    return r
+
+
+def alloc_stats():
+    """Return K object allocation counters as a dict
+
+    allocated - objects allocated from Python's allocator
+    reused - objects taken from the free list
+    cached - requests served by a cached atom (::, booleans, small longs)
+    free, free_max - current and maximum size of the free list
+
+    The maximum size of the free list can be changed with
+    _k.set_freelist_size().
+    """
+    return _k.alloc_stats()
+
+
+def _check_tracing():
+    if tracemalloc is None or sys.version_info < (3, 7):
+        raise RuntimeError("tracing K objects requires Python 3.7 or later")
+
+
+def start(nframe=1):
+    """Start tracing allocations of K objects (and Python memory)"""
+    _check_tracing()
+    tracemalloc.start(nframe)
+
+
+def stop():
+    """Stop tracing and clear the traces"""
+    _check_tracing()
+    tracemalloc.stop()
+
+
+def snapshot():
+    """Return a tracemalloc.Snapshot of the live K objects"""
+    _check_tracing()
+    s = tracemalloc.take_snapshot()
+    return s.filter_traces([tracemalloc.DomainFilter(True, DOMAIN)])
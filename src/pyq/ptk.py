@@ -5,6 +5,8 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import re
+from bisect import bisect_left, insort
+from functools import partial
 from prompt_toolkit.completion import Completion
 from prompt_toolkit.contrib.completers import PathCompleter
 from prompt_toolkit.contrib.completers.base import Completer
@@ -36,64 +38,136 @@ style_dict = {
 }
 
 
-def get_bottom_toolbar_tokens(cli):
-    mem = q('.Q.w', '') // 1024  # memory info in KiB
-    return [(Token.Toolbar, "{0} {1.used}/{1.mphy} KiB".format(KDB_INFO, mem))]
+def get_bottom_toolbar_tokens(cli, stats):
+    memory = stats.memory
+    text = "{0} {1}/{2} KiB".format(KDB_INFO, memory[0] // 1024,
+                                    memory[5] // 1024)
+    if stats.query_time is not None:
+        text += " | last {0:.3f}s {1:+d} KiB".format(
+            stats.query_time, int(stats.query_bytes / 1024))
+    return [(Token.Toolbar, text)]
 
 
 history = InMemoryHistory()
 
 
-def get_prompt_tokens(_):
-    namespace = q(r'\d')
-    if namespace == '.':
-        namespace = ''
-    return [(Token.Generic.Prompt, 'q%s)' % namespace)]
+def get_prompt_tokens(cli, stats):
+    return [(Token.Generic.Prompt, 'q%s)' % stats.namespace)]
 
 
 HSYM_RE = re.compile(r'.*`:([\w/.]*)$')
+# A column of a table, a key of a dictionary or a name in a namespace:
+# t.c, t`c or .ns.x
+MEMBER_RE = re.compile(r'.*?([a-zA-Z.][\w.]*?)[.`](\w*)$')
+
+_namespace_state = q('{(d;count k;last k:key d:system"d")}')
+_namespace_tail = q('{x _ key y}')
+_members = q('{@[{$[98=t:type v:get x;cols v;99<>t;`$();11=type k:key v;'
+             'k except`;98=type k;cols v;`$()]};x;`$()]}')
+
+
+class WordIndex(object):
+    """Sorted list of words with prefix search"""
+
+    def __init__(self, words=(), meta=''):
+        self.words = sorted(set(w for w in words if w))
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.words)
+
+    def add(self, words):
+        for w in filter(None, words):
+            i = bisect_left(self.words, w)
+            if i == len(self.words) or self.words[i] != w:
+                insort(self.words, w)
+
+    def complete(self, prefix):
+        """Yield the words that start with prefix in sorted order"""
+        words = self.words
+        for i in range(bisect_left(words, prefix), len(words)):
+            if not words[i].startswith(prefix):
+                break
+            yield words[i]
 
 
 class QCompleter(Completer):
-    """Completer for the q language"""
+    """Completer for the q language
+
+    The index of reserved words and .q functions is built once.  Names
+    in the current namespace are updated incrementally by refresh(),
+    which is called before every prompt.
+    """
 
     def __init__(self):
-        namespace = q(r'\d')
-        res = q('.Q.res')
-        dot_q = q('1_key .q')
         self.path_completer = PathCompleter()
-        self.words_info = [(list(res), 'k'),
-                           (list(dot_q), 'q'),
-                           (list(q.key(namespace)), str(namespace))]
+        self.words_info = [WordIndex(map(str, q('.Q.res')), 'k'),
+                           WordIndex(map(str, q('1_key .q')), 'q'),
+                           WordIndex()]
+        self._state = None
+        self.refresh()
+
+    def refresh(self):
+        """Update the index after the current namespace has changed
+
+        Names that were appended to the namespace are added to the
+        index; any other change causes the namespace to be reindexed.
+        """
+        namespace, n, last = _namespace_state()
+        state = str(namespace), int(n), str(last)
+        old = self._state
+        if state == old:
+            return
+        if old is not None and old[0] == state[0] and 0 < old[1] < state[1]:
+            tail = _namespace_tail(old[1] - 1, namespace)
+            if str(tail[0]) == old[2]:
+                self.words_info[2].add(map(str, tail[1:]))
+                self._state = state
+                return
+        self.words_info[2] = WordIndex(map(str, q.key(namespace)),
+                                       state[0])
+        self._state = state
 
     def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
         # Detect a file handle
-        m = HSYM_RE.match(document.text_before_cursor)
+        m = HSYM_RE.match(text)
         if m:
             text = m.group(1)
             doc = Document(text, len(text))
             for c in self.path_completer.get_completions(doc, complete_event):
                 yield c
-        else:
-            # Get word/text before cursor.
-            word_before_cursor = document.get_word_before_cursor(False)
-            for words, meta in self.words_info:
-                for a in words:
-                    if a.startswith(word_before_cursor):
-                        yield Completion(a, -len(word_before_cursor),
-                                         display_meta=meta)
+            return
+        m = MEMBER_RE.match(text)
+        if m:
+            name, prefix = m.groups()
+            members = WordIndex(map(str, _members(name)), name)
+            if len(members):
+                for a in members.complete(prefix):
+                    yield Completion(a, -len(prefix), display_meta=name)
+                return
+        # Get word/text before cursor.
+        word_before_cursor = document.get_word_before_cursor(False)
+        for index in self.words_info:
+            for a in index.complete(word_before_cursor):
+                yield Completion(a, -len(word_before_cursor),
+                                 display_meta=index.meta)
 
 
 def cmdloop(self, intro=None):
     style = style_from_pygments(BasicStyle, style_dict)
     self.preloop()
     stop = None
+    completer = QCompleter()
+    toolbar_tokens = partial(get_bottom_toolbar_tokens, stats=self.stats)
+    prompt_tokens = partial(get_prompt_tokens, stats=self.stats)
     while not stop:
-        line = prompt(get_prompt_tokens=get_prompt_tokens, lexer=lexer,
-                      get_bottom_toolbar_tokens=get_bottom_toolbar_tokens,
+        completer.refresh()
+        line = prompt(get_prompt_tokens=prompt_tokens, lexer=lexer,
+                      get_bottom_toolbar_tokens=toolbar_tokens,
                       history=history, style=style, true_color=True,
                       on_exit='return-none', on_abort='return-none',
-                      completer=QCompleter())
+                      completer=completer)
         if line is None or line.strip() == r'\\':
             raise SystemExit
         else:
@@ -0,0 +1,92 @@
+"""Shared-memory transfer of K objects between pyq processes
+
+put() writes a K object to a directory under /dev/shm (or the system
+temporary directory if /dev/shm does not exist) in q's own file format
+and returns the name of the block.  get() reads it back in any process
+on the same host.  Table columns are stored as separate files, so q
+memory-maps simple (numeric and temporal) columns instead of copying
+them.
+
+>>> name = put(q('([]a:til 3;b:`x`y`z)'))
+>>> get(name)
+k('+`a`b!(0 1 2;`x`y`z)')
+>>> unlink(name)
+
+Blocks are not removed automatically: call unlink() once every process
+that needs the data has called get().  Objects that were already read
+stay valid after unlink().
+"""
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import uuid
+
+from . import K, q
+
+__all__ = ['put', 'get', 'unlink', 'path']
+
+ROOT = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+_set = q('{(hsym`$x)set y}')
+_get = q('{get hsym`$x}')
+_keyed = q('{98 98h~type each(key x;value x)}')
+
+
+def path(name):
+    """Return the file system path of the block name"""
+    return os.path.join(ROOT, name)
+
+
+def put(x, name=None):
+    """Store x in a new shared-memory block and return its name
+
+    A unique name is generated unless one is given.  Raises OSError if
+    a block with the given name already exists.
+    """
+    if name is None:
+        name = 'pyq-' + uuid.uuid4().hex
+    p = path(name)
+    os.mkdir(p)
+    try:
+        _write(p, K(x))
+    except BaseException:
+        shutil.rmtree(p, ignore_errors=True)
+        raise
+    return name
+
+
+def get(name):
+    """Return the K object stored in the block name"""
+    return _read(path(name))
+
+
+def unlink(name):
+    """Remove the block name"""
+    shutil.rmtree(path(name))
+
+
+def _write(p, x):
+    if x._t == 98:
+        cols = x.cols
+        _set(os.path.join(p, '.d'), cols)
+        for c in cols:
+            _set(os.path.join(p, str(c)), x[c])
+    elif x._t == 99 and _keyed(x):
+        for part in ('key', 'value'):
+            os.mkdir(os.path.join(p, part))
+            _write(os.path.join(p, part), q(part, x))
+    else:
+        _set(os.path.join(p, 'x'), x)
+
+
+def _read(p):
+    if os.path.exists(os.path.join(p, '.d')):
+        cols = _get(os.path.join(p, '.d'))
+        return q('flip', q('!', cols,
+                           [_get(os.path.join(p, str(c))) for c in cols]))
+    if os.path.isdir(os.path.join(p, 'key')):
+        return q('!', _read(os.path.join(p, 'key')),
+                 _read(os.path.join(p, 'value')))
+    return _get(os.path.join(p, 'x'))
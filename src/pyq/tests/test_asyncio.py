@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+import pytest
+
+asyncio = pytest.importorskip('asyncio')
+
+from pyq import kerr  # noqa: E402
+from pyq.asyncio import QEventLoop, query  # noqa: E402
+# See #942
+from pyq.conftest import kdb_server, kdb_port  # noqa: E402
+
+
+@pytest.fixture
+def loop():
+    loop = QEventLoop()
+    yield loop
+    loop.close()
+
+
+def test_query(q, kdb_port, loop):
+    h = q.hopen(kdb_port)
+    try:
+        futures = [query(h, '{x+y}', i, 1, loop=loop) for i in range(10)]
+        r = loop.run_until_complete(asyncio.gather(*futures))
+        assert r == list(range(1, 11))
+    finally:
+        q.hclose(h)
+
+
+def test_query_error(q, kdb_port, loop):
+    h = q.hopen(kdb_port)
+    try:
+        with pytest.raises(kerr) as info:
+            loop.run_until_complete(query(h, '1+`a', loop=loop))
+        assert info.value.args[0] == 'type'
+    finally:
+        q.hclose(h)
+
+
+def test_query_timeout(q, kdb_port, loop):
+    h = q.hopen(kdb_port)
+    try:
+        f = query(h, 'system"sleep 1";42', loop=loop)
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(asyncio.wait_for(f, 0.05))
+        # The late reply is discarded.
+        f = query(h, '43', loop=loop)
+        assert loop.run_until_complete(f) == 43
+    finally:
+        q.hclose(h)
+
+
+def test_step(loop):
+    calls = []
+    loop.call_soon(calls.append, 1)
+    loop.step()
+    assert calls == [1]
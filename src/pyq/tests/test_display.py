@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+
+import pytest
+
+from pyq import q, display
+
+
+@pytest.fixture
+def big():
+    return q('([]a:til 1000;s:1000#`x`y;c:1000#enlist"a<b")')
+
+
+def test_html_small():
+    t = q('([]a:1 2;b:`x`y)')
+    h = t._repr_html_()
+    assert h.count('<tr>') == 3
+    assert '<td>...</td>' not in h
+    assert '2 rows &times; 2 columns' in h
+
+
+def test_html_big(big):
+    h = display.html(big, rows=10)
+    assert h.count('<tr>') == 1 + 10 + 1
+    assert '<td>999</td>' in h
+    assert '<td>a&lt;b</td>' in h
+    assert '1000 rows &times; 3 columns' in h
+
+
+def test_html_keyed():
+    h = q('([k:`x`y]a:1 2)')._repr_html_()
+    assert '<th>x</th><td>1</td>' in h
+
+
+def test_html_dict():
+    h = q('`a`b!1 2')._repr_html_()
+    assert '<th>key</th><th>value</th>' in h
+    assert '<th>a</th><td>1</td>' in h
+
+
+@pytest.mark.parametrize('code', ['1 2 3', '([]a:1 2)!3 4'])
+def test_html_other(code):
+    assert q(code)._repr_html_() is None
+
+
+def test_pager(big):
+    p = display.Pager(big, rows=300)
+    assert len(p) == 4
+    h = p[-1]._repr_html_()
+    assert h.count('<tr>') == 1 + 100
+    assert 'rows 900 to 999 of 1000' in h
+    with pytest.raises(IndexError):
+        p[4]
+
+
+def test_text(big):
+    s = display.text(big, rows=5)
+    assert s.endswith('..\n(1000 rows)\n')
+    assert '999' not in s
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import threading
+
+import pytest
+
+futures = pytest.importorskip('concurrent.futures')
+
+from pyq import q, kerr, _k  # noqa: E402
+from pyq.executor import QExecutor  # noqa: E402
+
+
+def test_is_q_thread():
+    result = []
+    thread = threading.Thread(target=lambda: result.append(_k.is_q_thread()))
+    thread.start()
+    thread.join()
+    assert _k.is_q_thread()
+    assert result == [False]
+
+
+def test_is_main_thread():
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(_k.is_main_thread()))
+    thread.start()
+    thread.join()
+    assert _k.is_main_thread()
+    assert result == [False]
+
+
+def test_deferred_release():
+    x = [q('til 10')]
+    thread = threading.Thread(target=x.pop)
+    thread.start()
+    thread.join()
+    assert _k.release_deferred() == 1
+
+
+def test_release_deferred_on_worker():
+    errors = []
+
+    def release():
+        try:
+            _k.release_deferred()
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=release)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+
+
+def test_submit_from_workers():
+    with QExecutor() as qx:
+        with futures.ThreadPoolExecutor(4) as pool:
+            results = [pool.submit(lambda n: qx.submit(q.til, n).result(), n)
+                       for n in range(8)]
+            done = 0
+            while done < len(results):
+                done = sum(f.done() for f in results)
+                qx.poll(0.1)
+        assert [r.result() for r in results] == [list(range(n))
+                                                 for n in range(8)]
+
+
+def test_submit_on_main_thread():
+    with QExecutor() as qx:
+        assert qx.submit(q, '1+1').result() == 2
+        f = qx.submit(q, '1+`')
+        assert isinstance(f.exception(), kerr)
+
+
+def test_shutdown():
+    qx = QExecutor()
+    qx.shutdown()
+    with pytest.raises(RuntimeError):
+        qx.submit(q.til, 3)
+
+
+def test_poll_drains_wakeups():
+    import time
+    with QExecutor() as qx:
+        thread = threading.Thread(target=qx.submit, args=(q.til, 3))
+        thread.start()
+        thread.join()
+        assert qx.poll() == 1
+        # The wakeup byte has been consumed, so poll waits again.
+        start = time.time()
+        assert qx.poll(0.2) == 0
+        assert time.time() - start >= 0.15
+
+
+def test_poll_on_worker():
+    result = []
+    with QExecutor() as qx:
+        f = []
+        thread = threading.Thread(
+            target=lambda: (f.append(qx.submit(q.til, 3)),
+                            result.append(qx.poll())))
+        thread.start()
+        thread.join()
+        assert result == [0]
+        assert not f[0].done()
+        assert qx.poll() == 1
+        assert f[0].result() == [0, 1, 2]
@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from pyq import q, mmap_table  # noqa: E402
+
+
+@pytest.fixture
+def db(tmpdir):
+    t = q('([]b:101b;x:0x0102ff;h:1 2 3h;i:1 2 3i;j:1 2 3;e:1 2 3e;'
+          'f:1 2 3f;c:"abc";p:2000.01.01D+1 2 3;d:2000.01.01+1 2 3;'
+          'n:1 2 3n;s:`x`y`x;str:("a";"bc";"def"))')
+    q('{.Q.dd[x;`t`]set .Q.en[x]y}', q.hsym(tmpdir.strpath), t)
+    return tmpdir
+
+
+@pytest.mark.parametrize('name, a', [
+    ('b', [True, False, True]),
+    ('x', [1, 2, 255]),
+    ('h', [1, 2, 3]),
+    ('i', [1, 2, 3]),
+    ('j', [1, 2, 3]),
+    ('e', [1, 2, 3]),
+    ('f', [1, 2, 3]),
+    ('c', [b'a', b'b', b'c']),
+    ('p', [1, 2, 3]),
+    ('d', [1, 2, 3]),
+    ('n', numpy.array([1, 2, 3], 'm8[ns]')),
+])
+def test_columns(db, name, a):
+    t = mmap_table(db.join('t').strpath)
+    assert t[name].tolist() == numpy.asarray(a).tolist()
+    assert t.type(name) == int(q('type', t.k(name)))
+
+
+def test_table(db):
+    t = mmap_table(db.join('t').strpath)
+    assert t.columns == list('bxhijefcpdn') + ['s', 'str']
+    assert len(t) == 3
+    assert 'j' in t
+    assert not t['j'].flags.writeable
+    with pytest.raises(KeyError):
+        t['z']
+
+
+def test_enum(db):
+    t = mmap_table(db.join('t').strpath)
+    assert t.type('s') == 20
+    assert t.decode('s').tolist() == ['x', 'y', 'x']
+    with pytest.raises(TypeError):
+        t.decode('j')
+
+
+def test_nested(db):
+    t = mmap_table(db.join('t').strpath)
+    with pytest.raises(TypeError):
+        t['str']
+    assert t.k('str') == q('("a";"bc";"def")')
+
+
+def test_not_a_table(tmpdir):
+    with pytest.raises(IOError):
+        mmap_table(tmpdir.strpath)
@@ -0,0 +1,192 @@
+from __future__ import absolute_import
+
+import os
+import subprocess
+
+import pytest
+
+from pyq import kerr, kp
+from pyq.ipc import (ConnectionPool, Publisher, ReplyTimeout, address_key,
+                     fetch, gather, is_connection_error)
+# See #942
+from pyq.conftest import kdb_server, kdb_port
+
+
+@pytest.mark.parametrize('address, key', [
+    (5001, 'localhost:5001'),
+    ('5001', 'localhost:5001'),
+    ('host:5001', 'host:5001'),
+    (':host:5001', 'host:5001'),
+    ('`:host:5001', 'host:5001'),
+])
+def test_address_key(address, key):
+    assert address_key(address) == key
+
+
+def test_is_connection_error():
+    assert is_connection_error(kerr('close'))
+    assert is_connection_error(OSError('connection'))
+    assert is_connection_error(ReplyTimeout('timeout'))
+    assert not is_connection_error(kerr('type'))
+    assert not is_connection_error(ValueError())
+
+
+def test_pool_reuse(kdb_port):
+    with ConnectionPool(max_size=2) as pool:
+        h1 = pool.acquire(kdb_port)
+        pool.release(kdb_port, h1)
+        h2 = pool.acquire(kdb_port)
+        assert int(h1) == int(h2)
+        assert h2(kp('1+1')) == 2
+        pool.release(kdb_port, h2)
+
+
+def test_pool_max_size(kdb_port):
+    with ConnectionPool(max_size=1) as pool:
+        h = pool.acquire(kdb_port)
+        with pytest.raises(kerr):
+            pool.acquire(kdb_port, wait=0.01)
+        pool.release(kdb_port, h)
+        pool.release(kdb_port, pool.acquire(kdb_port, wait=0.01))
+
+
+def test_pool_idle_timeout(kdb_port):
+    with ConnectionPool(idle_timeout=0) as pool:
+        h1 = pool.acquire(kdb_port)
+        pool.release(kdb_port, h1)
+        h2 = pool.acquire(kdb_port)
+        assert h2(kp('.z.w')) != 0
+        pool.release(kdb_port, h2)
+        assert pool._open[address_key(kdb_port)] == 1
+
+
+def test_pool_reconnect(kdb_port):
+    with ConnectionPool() as pool:
+        with pool.connection(kdb_port) as h:
+            # Ask the server to close the connection.
+            (-h)(kp('hclose .z.w'))
+        assert pool.call(kdb_port, '{x+y}', 1, 2) == 3
+
+
+def test_pool_closed(kdb_port):
+    pool = ConnectionPool()
+    pool.close()
+    with pytest.raises(ValueError):
+        pool.acquire(kdb_port)
+
+
+def test_gather(q, kdb_port):
+    h1, h2 = [q.hopen(kdb_port) for _ in range(2)]
+    try:
+        r = gather([(h1, '{x+y}', (1, 2)),
+                    (h2, 'til 3', ()),
+                    (h1, '`a`b', ())])
+        assert r == [3, [0, 1, 2], ['a', 'b']]
+    finally:
+        q.hclose(h1)
+        q.hclose(h2)
+
+
+def test_gather_error(q, kdb_port):
+    h = q.hopen(kdb_port)
+    try:
+        with pytest.raises(kerr) as info:
+            gather([(h, '1+`a', ()), (h, '1+1', ())])
+        assert info.value.args[0] == 'type'
+        # The second reply was drained - the connection is still usable.
+        assert h(kp('2+2')) == 4
+    finally:
+        q.hclose(h)
+
+
+def test_gather_timeout(q, kdb_port):
+    h = q.hopen(kdb_port)
+    try:
+        with pytest.raises(ReplyTimeout) as info:
+            gather([(h, 'system"sleep 1"', (), 0.05)])
+        assert info.value.args[0] == 'timeout'
+    finally:
+        q.hclose(h)
+
+
+def test_pool_discards_timed_out(kdb_port):
+    with ConnectionPool() as pool:
+        with pytest.raises(ReplyTimeout):
+            with pool.connection(kdb_port) as h:
+                gather([(h, 'system"sleep 1"', (), 0.05)])
+        assert pool._open[address_key(kdb_port)] == 0
+
+
+def test_publisher(q, kdb_port):
+    h = q.hopen(kdb_port)
+    try:
+        h(kp("trade:([]sym:`$();price:`float$());"
+             ".u.upd:{[t;x]t insert x}"))
+        with Publisher(h, max_rows=3, max_delay=60) as pub:
+            pub.publish_many('trade', [('a', 1.0), ('b', 2.0)])
+            assert pub.queue_depth == 2
+            assert [c._t for c in pub._buffers['trade']] == [11, 9]
+            assert pub.message_count == 0
+            pub.publish('trade', ('c', 3.0))
+            assert pub.queue_depth == 0
+            assert pub.message_count == 1
+            pub.publish('trade', ('d', 4.0))
+        assert pub.stats()['row_count'] == 4
+        assert h(kp('exec sym from trade')) == list('abcd')
+    finally:
+        q.hclose(h)
+
+
+def test_publisher_max_delay(q, kdb_port):
+    h = q.hopen(kdb_port)
+    try:
+        h(kp("t:([]a:`long$());.u.upd:insert"))
+        pub = Publisher(h, max_delay=0)
+        pub.publish('t', (1,))
+        assert pub.queue_depth == 0
+        assert h(kp('count t')) == 1
+    finally:
+        q.hclose(h)
+
+
+PUBLISHER_TIMER_CODE = """\
+from pyq import kp
+from pyq.ipc import Publisher
+h = q.hopen(%d)
+h(kp("t:([]a:`long$());.u.upd:insert"))
+pub = Publisher(h, max_delay=0.05)
+pub.publish('t', (1,))
+q.h = h
+q).z.ts:{exit"i"$1<>h"count t"};system"t 500"
+"""
+
+
+@pytest.mark.skipif("sys.platform == 'win32'")
+def test_publisher_timer(tmpdir, kdb_port):
+    # The timer flushes from q's main loop, so run it in a q script.
+    qbin = os.getenv('QBIN')
+    script = tmpdir.join('x.p')
+    script.write(PUBLISHER_TIMER_CODE % kdb_port)
+    subprocess.check_call([qbin, script.strpath, '-q'])
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_fetch(q, kdb_port, compress):
+    h = q.hopen(kdb_port)
+    try:
+        h(kp("t:([]a:til 10;b:10?`3)"))
+        chunks = list(fetch(h, 't', chunk_rows=4, compress=compress))
+        assert [len(c) for c in chunks] == [4, 4, 2]
+        assert q('raze', chunks) == h(kp('t'))
+        # Nothing is left behind on the server.
+        assert not h(kp('any key[`.pyq]like"r*"'))
+    finally:
+        q.hclose(h)
+
+
+def test_fetch_small(q, kdb_port):
+    h = q.hopen(kdb_port)
+    try:
+        assert list(fetch(h, '{til x}', (3,))) == [[0, 1, 2]]
+    finally:
+        q.hclose(h)
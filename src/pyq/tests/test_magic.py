@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
-from ..magic import q as qmag, logical_lines
+import pytest
+from ..magic import q as qmag, qtime, logical_lines
 
 
 def test_q_magic_cell():
@@ -62,3 +63,75 @@ def test_q_magic_input():
     ns = dict(x=1, y=2)
     r = qmag('-i x,y', "x+y", ns)
     assert r == 3
+
+
+def test_q_magic_timing(capsys):
+    r = qmag('-t', "a:til 1000000\nsum a")
+    out = capsys.readouterr()[0].splitlines()
+    assert r == 499999500000
+    assert out[0].startswith('[1] ')
+    assert 'heap +7.6' in out[0]
+    assert out[1].startswith('[2] ')
+    assert 'result 17 B' in out[1]  # -8!0j
+
+
+def test_q_magic_repeat(capsys):
+    r = qmag('-r 3', "1+1")
+    out = capsys.readouterr()[0]
+    assert r == 2
+    assert 'mean +- std of 3 runs' in out
+
+
+def test_qtime(capsys):
+    r = qtime('-r 2 til  3')
+    out = capsys.readouterr()[0]
+    assert r == [0, 1, 2]
+    assert 'of 2 runs' in out
+    assert 'result ' in out
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('-1 2', [-1, 2]),
+    ('-1"x";', None),
+    ('-5#til 10', [5, 6, 7, 8, 9]),
+    ('-r 2 -5#til 10', [5, 6, 7, 8, 9]),
+    ('-- -r:2', -2),
+])
+def test_qtime_negative_code(line, expected):
+    assert qtime(line) == expected
+
+
+@pytest.mark.parametrize('n', ['0', '-1', 'x'])
+def test_qtime_bad_repeat(capsys, n):
+    assert qtime('-r %s til 3' % n) is None
+    assert capsys.readouterr()[0].startswith('Usage:')
+
+
+def test_q_magic_bad_repeat(capsys):
+    assert qmag('-r 0', "1+1") is None
+    assert capsys.readouterr()[0].startswith('Usage:')
+
+
+def test_q_magic_stdout(monkeypatch):
+    import io
+    from .. import magic
+    out = io.StringIO()
+    monkeypatch.setitem(magic.STD_STREAM, 1, out)
+    r = qmag('-1', '-1"first";\n{-1 x;1}each 1000#enlist 50#"x";\n-1"last";')
+    assert r is None
+    lines = out.getvalue().splitlines()
+    assert lines[0] == 'first'
+    assert len(lines) == 1002
+    assert lines[-1] == 'last'
+
+
+def test_q_magic_stdout_timing(monkeypatch):
+    import io
+    from .. import magic
+    out = io.StringIO()
+    monkeypatch.setitem(magic.STD_STREAM, 1, out)
+    monkeypatch.setattr('sys.stdout', out)
+    qmag('-1 -t', '-1"a";\n-1"b";')
+    lines = out.getvalue().splitlines()
+    assert lines[0::2] == ['a', 'b']
+    assert lines[1].startswith('[1] ') and lines[3].startswith('[2] ')
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import pytest
+
+from pyq import q, _k, memory
+
+
+def test_memory_stats():
+    objects, nbytes = _k.memory_stats()
+    x = q('til 1000')
+    objects1, nbytes1 = _k.memory_stats()
+    assert objects1 == objects + 1
+    assert nbytes1 - nbytes == 16 + 8 * 1000
+    del x
+    assert _k.memory_stats() == (objects, nbytes)
+
+
+def test_memory_stats_table():
+    objects, nbytes = _k.memory_stats()
+    x = q('([]a:til 1000;b:1000#0b)')
+    assert _k.memory_stats()[1] - nbytes > 9000
+    del x
+
+
+def test_memory_stats_append():
+    x = q('0#0')
+    nbytes = _k.memory_stats()[1]
+    for i in range(100):
+        x._ja(i)
+    assert _k.memory_stats()[1] - nbytes == 800
+
+
+def test_stats():
+    s = memory.stats()
+    assert s['objects'] > 0
+    assert 'used' in s and 'heap' in s
+
+
+def make():
+    return q('til 100000')
+
+
+@pytest.mark.skipif("sys.version_info < (3, 7)")
+def test_snapshot():
+    memory.start(25)
+    try:
+        x = make()
+        stats = memory.snapshot().statistics('traceback')
+    finally:
+        memory.stop()
+    top = stats[0]
+    assert top.size >= 800000
+    assert any(f.filename.startswith(__file__.rstrip('co'))
+               for f in top.traceback)
+    del x
+
+
+@pytest.mark.skipif("sys.version_info >= (3, 7)")
+def test_start_unsupported():
+    with pytest.raises(RuntimeError):
+        memory.start()
+
+
+def test_cached_atoms():
+    assert q('1b') is q('1b')
+    assert q('0b') is q('0b')
+    assert q('42') is q('42')
+    assert q('::') is q('::')
+    assert q('1000') is not q('1000')
+    assert q('42') == 42
+
+
+def test_cached_atom_buffer():
+    x = q('42')
+    m = memoryview(x)
+    assert not m.readonly
+    assert q('42') is not x  # exporting the buffer removed x from the cache
+
+
+def test_cached_atom_array_struct():
+    x = q('43')
+    s = x.__array_struct__
+    assert s is not None
+    assert q('43') is not x  # the exported array may write to x
+
+
+def test_alloc_stats():
+    s = memory.alloc_stats()
+    q('1b')
+    assert memory.alloc_stats()['cached'] > s['cached']
+
+
+@pytest.mark.skipif("_k.alloc_stats()['free_max'] == 0")
+def test_free_list():
+    old = _k.set_freelist_size(10)
+    try:
+        x = q('til 3')
+        del x
+        s = memory.alloc_stats()
+        assert s['free'] >= 1
+        x = q('til 3')
+        assert memory.alloc_stats()['reused'] > s['reused']
+        assert x == [0, 1, 2]
+        _k.set_freelist_size(0)
+        assert memory.alloc_stats()['free'] == 0
+    finally:
+        _k.set_freelist_size(old)
@@ -467,3 +467,13 @@ def test_call_python(q):
         return numpy.array([1.0, 2.0])
     q.f = f
     assert q("f()") == [1.0, 2.0]
+
+
+@pytest.mark.parametrize('dtype', ['q', 'd', 'M8[ns]', 'M8[D]', 'm8[s]'])
+@pytest.mark.parametrize('step', [1, 2])
+def test_large_array_conversion(dtype, step):
+    # Copies of this size are done without holding the GIL.
+    a = numpy.arange(1 << 19, dtype='q').astype(dtype)[::step]
+    x = K(a)
+    assert len(x) == len(a)
+    assert x[-3:] == K(a[-3:])
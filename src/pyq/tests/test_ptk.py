@@ -0,0 +1,50 @@
+from __future__ import absolute_import
+
+import pytest
+
+try:
+    from pyq import ptk
+except ImportError:
+    ptk = None
+
+pytestmark = pytest.mark.skipif(ptk is None,
+                                reason="requires prompt_toolkit 1.x")
+
+
+def completions(completer, text):
+    from prompt_toolkit.document import Document
+    doc = Document(text, len(text))
+    return [c.text for c in completer.get_completions(doc, None)]
+
+
+def test_word_index():
+    index = ptk.WordIndex(['abc', 'abd', 'b', 'ab', ''])
+    assert list(index.complete('ab')) == ['ab', 'abc', 'abd']
+    index.add(['abb', 'abc'])
+    assert list(index.complete('ab')) == ['ab', 'abb', 'abc', 'abd']
+    assert list(index.complete('x')) == []
+
+
+def test_refresh(q):
+    completer = ptk.QCompleter()
+    q.ptk_test_1 = 1
+    completer.refresh()
+    assert 'ptk_test_1' in completions(completer, 'ptk_test_')
+    q.ptk_test_2 = 2
+    completer.refresh()
+    assert completions(completer, 'ptk_test_') == ['ptk_test_1',
+                                                   'ptk_test_2']
+    del q.ptk_test_1
+    completer.refresh()
+    assert completions(completer, 'ptk_test_') == ['ptk_test_2']
+    del q.ptk_test_2
+
+
+def test_members(q):
+    q('ptk_t:([]alpha:1 2;beta:3 4;also:5 6)')
+    q('ptk_d:`apple`avocado!1 2')
+    completer = ptk.QCompleter()
+    assert completions(completer, 'ptk_t.al') == ['alpha', 'also']
+    assert completions(completer, 'select from ptk_t`b') == ['beta']
+    assert completions(completer, 'ptk_d.a') == ['apple', 'avocado']
+    assert 'til' in completions(completer, '.q.ti')
@@ -163,6 +163,47 @@ def test_pyq_trace():
     assert b"pyq trace is on" in output
 
 
+@linux_only
+def test_pyq_threads(monkeypatch):
+    monkeypatch.setenv('PYQ_THREADS', '2')
+    monkeypatch.delenv('OMP_NUM_THREADS', raising=False)
+    output = subprocess.check_output(['pyq', '-c', """if 1:
+        import os
+        from pyq import q
+        print(int(q('\\\\s')), os.environ['OMP_NUM_THREADS'])
+    """])
+    assert output.split() == [b'2', b'2']
+
+
+@linux_only
+def test_pyq_trace_topology(monkeypatch):
+    monkeypatch.setenv('PYQ_THREADS', '2')
+    monkeypatch.setenv('PYQ_MEMPOLICY', 'interleave')
+    output = subprocess.check_output(['pyq', '--pyq-trace', '-c', '0'])
+    assert b"cpus = " in output
+    assert b"mempolicy = interleave" in output
+    assert b"threads = 2" in output
+
+
+@linux_only
+@pytest.mark.parametrize('policy', ['nonsense', 'default:0'])
+def test_pyq_bad_mempolicy(monkeypatch, policy):
+    monkeypatch.setenv('PYQ_MEMPOLICY', policy)
+    p = subprocess.Popen(['pyq', '-c', '0'], stderr=subprocess.PIPE)
+    errors = p.stderr.read()
+    assert p.wait() != 0
+    assert b"PYQ_MEMPOLICY" in errors
+
+
+@pytest.mark.parametrize('threads', ['0', '-1', 'two', '2x'])
+def test_pyq_bad_threads(monkeypatch, threads):
+    monkeypatch.setenv('PYQ_THREADS', threads)
+    p = subprocess.Popen(['pyq', '-c', '0'], stderr=subprocess.PIPE)
+    errors = p.stderr.read()
+    assert p.wait() != 0
+    assert b"PYQ_THREADS" in errors
+
+
 def test_pyq_preload(tmpdir, q):
     db = tmpdir.join('db')
     q.x = q.til(3)
@@ -177,3 +218,24 @@ def test_p__file__0(tmpdir):
     p.write("print(__file__)")
     out = subprocess.check_output(['pyq', str(p)])
     assert out.strip().endswith(str(p).encode())
+
+
+def test_pyq_lazy_builtins():
+    out = subprocess.check_output(['pyq', '-c', """if 1:
+        import pyq
+        print(type(pyq.K.__dict__['ungroup']).__name__)
+        pyq.K.ungroup
+        print(type(pyq.K.__dict__['ungroup']).__name__)
+    """])
+    assert out.split() == [b'_Builtin', b'K']
+
+
+def test_pyq_builtins_not_evaluated_on_import():
+    out = subprocess.check_output(['pyq', '-c', """if 1:
+        import pyq
+        kinds = [type(pyq.K.__dict__.get(a)) for a, _ in pyq._q_builtins()]
+        print(kinds.count(pyq._Builtin), kinds.count(pyq.K))
+    """])
+    lazy, evaluated = out.split()
+    assert int(lazy) > 100
+    assert evaluated == b'0'
@@ -9,6 +9,7 @@ import math
 import pytest
 from datetime import timedelta
 import os
+import sys
 
 from pyq import *
 from pyq import Q_VERSION, _PY3K
@@ -29,6 +30,100 @@ class TestPickle(unittest.TestCase):
             y = pickle.loads(s)
         self.assertEqual(x, y)
 
+    @unittest.skipIf(sys.version_info < (3, 8), "requires pickle protocol 5")
+    def test_out_of_band(self):
+        import pickle
+
+        x = q('([]a:til 1000;b:1000?`3)')
+        buffers = []
+        s = pickle.dumps(x, protocol=5, buffer_callback=buffers.append)
+        self.assertEqual(len(buffers), 1)
+        self.assertLess(len(s), 100)
+        self.assertEqual(pickle.loads(s, buffers=buffers), x)
+        # Buffers received from another process are not K objects.
+        raw = [bytearray(b.raw()) for b in buffers]
+        self.assertEqual(pickle.loads(s, buffers=raw), x)
+        # In-band protocol 5 pickle.
+        self.assertEqual(pickle.loads(pickle.dumps(x, protocol=5)), x)
+
+    def test_d9_sliced_view(self):
+        from pyq import d9
+        b = q('0x0000,-8!til 3')
+        self.assertEqual(d9(memoryview(b)[2:]), q('til 3'))
+        # A view of the whole vector is deserialized in place.
+        self.assertEqual(d9(memoryview(q('-8!til 3'))), q('til 3'))
+
+
+@pytest.mark.parametrize('code', [
+    '42',
+    '"abc"',
+    '`a`b!1 2',
+    '([]a:til 1000;b:1000?`3;c:string til 1000)',
+    '([a:til 100]b:100?1f)',
+    '0#([]a:`long$();b:())',
+])
+@pytest.mark.parametrize('compress', [False, True])
+def test_dump_load(code, compress):
+    import io
+
+    x = q(code)
+    f = io.BytesIO()
+    x.dump(f, compress=compress, chunk_size=1000)
+    f.seek(0)
+    assert K.load_stream(f) == x
+    assert f.read() == b''
+
+
+@pytest.mark.parametrize('chunk_size', [100, 1 << 20])
+def test_dump_load_attributes(chunk_size):
+    import io
+
+    x = q('([]s:`s#til 1000;p:`p#where 10#100;g:`g#1000?`3;'
+          'u:`u#neg til 1000;n:til 1000)')
+    f = io.BytesIO()
+    x.dump(f, chunk_size=chunk_size)
+    q('1!', x).dump(f, chunk_size=chunk_size)
+    f.seek(0)
+    y = K.load_stream(f)
+    assert y == x
+    assert q('{attr each value flip x}', y) == q('`s`p`g`u`')
+    y = K.load_stream(f)
+    assert q('{attr each value flip x}', y.key) == q(',`s')
+
+
+def test_dump_chunks():
+    import io
+    from pyq import _read_frame
+
+    x = q('([]a:til 1000)')
+    f = io.BytesIO()
+    x.dump(f, chunk_size=800)
+    size = f.tell()
+    f.seek(0)
+    assert _read_frame(f) == q('(98h;enlist`a;1000;enlist`)')
+    chunks = []
+    while f.tell() < size:
+        chunks.append(_read_frame(f))
+    assert len(chunks) > 1
+    assert max(len(c) for c in chunks) <= 100
+    assert q('raze', chunks) == x.a
+
+
+def test_load_truncated():
+    import io
+
+    f = io.BytesIO()
+    q('til 10').dump(f)
+    with pytest.raises(EOFError):
+        K.load_stream(io.BytesIO(f.getvalue()[:-1]))
+
+
+def test_load_q_builtin(tmpdir):
+    path = tmpdir.join('x').strpath
+    q.set(q.hsym(path), 42)
+    q.hsym(path).load
+    assert q('x') == 42
+
 
 class TestBuiltinConversions(unittest.TestCase):
     def test_none(self):
@@ -530,6 +625,27 @@ def test_q_cmdloop(monkeypatch):
     assert called[0]
 
 
+def test_cmd_stats():
+    from ..cmd import Cmd
+    cmd = Cmd()
+    stats = cmd.stats
+    memory = stats.memory
+    assert len(memory) == 6
+    assert stats.memory is memory  # cached
+    assert stats.query_time is None
+    cmd.onecmd('cmd_stats_x:til 1000000')
+    assert stats.query_time > 0
+    assert stats.query_bytes >= 8000000
+    assert stats.memory is not memory
+    cmd.onecmd('\\d .cmdstats')
+    try:
+        assert stats.namespace == '.cmdstats'
+        assert 'q.cmdstats)' in cmd.prompt
+    finally:
+        cmd.onecmd('\\d .')
+        q('delete cmd_stats_x from`.')
+
+
 def test_contains():
     assert 1 in q('1 2 3')
     assert 'abc' in q('(1;2.0;`abc)')
@@ -569,6 +685,43 @@ def test_q_dir(q):
     assert 'foo' in dir(q)
 
 
+def test_operators_table(q):
+    ops = q('.p.ops')
+    assert q('~', K.__rsub__, ops['rsub'])
+    assert K(3) - 1 == 2 and 1 - K(3) == -2
+
+
+@pytest.mark.parametrize('fresh', [True, False])
+def test_load_operators_blob(q, tmpdir, monkeypatch, fresh):
+    import hashlib
+    import pyq
+    script = tmpdir.join('pyq-operators.q')
+    script.write('/ old\n')
+    digest = hashlib.md5(script.read_binary()).hexdigest()
+    if not fresh:
+        script.write('/ new\n')
+    blob = tmpdir.join(pyq.OPERATORS_BLOB)
+    q('{(hsym x)1:-8!(y;`ops`marker!(.p.ops;`blob))}', blob.strpath,
+      digest)
+    q('.p.marker:`none')
+    monkeypatch.setenv('QHOME', tmpdir.strpath)
+    assert q('~', pyq._load_operators(), q('.p.ops'))
+    assert q('.p.marker') == ('blob' if fresh else 'none')
+
+
+def test_load_operators_without_qhome(q, tmpdir, monkeypatch):
+    import pyq
+    # A stray blob in the current directory must not be used.
+    blob = tmpdir.join(pyq.OPERATORS_BLOB)
+    q('{(hsym x)1:-8!(`d41d8cd98f00b204e9800998ecf8427e;`marker!`stray)}',
+      blob.strpath)
+    q('.p.marker:`none')
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.delenv('QHOME', raising=False)
+    assert q('~', pyq._load_operators(), q('.p.ops'))
+    assert q('.p.marker') == 'none'
+
+
 @pytest.mark.skipif(not _PY3K, reason="exec is a keyword in Python <3")
 def test_plain_exec():
     t = q('([]a:1 2)')
@@ -871,6 +1024,31 @@ def test_misc_sizeof(q, x, n32, n64):
     assert BASE_SIZE + n == x.__sizeof__()
 
 
+@pytest.mark.skipif("Q_VERSION < 3")
+@pytest.mark.parametrize('x', [
+    '0b', '1 2 3', '`a`b', '("ab";1;`c)', '1 2!3 4', '([]a:1 2;b:`x`y)',
+    '([a:1 2]b:3 4)', '{x+y}', '+', '1+',
+])
+def test_sizes_match_q(q, x):
+    x = q(x)
+    exclusive, shared, mapped = x._sizes()
+    assert exclusive + shared == q('.p.sizeof', x)
+    assert mapped == 0
+
+
+@pytest.mark.skipif("Q_VERSION < 3")
+def test_sizes_shared(q):
+    a = q('til 100')
+    x = q('{(x;x)}', a)
+    sp = q('.p.sp')
+    exclusive, shared, mapped = x._sizes()
+    assert exclusive == 16 + 2 * sp
+    # a is counted once
+    assert shared == a._sizes()[0]
+    assert mapped == 0
+    assert x.__sizeof__() == BASE_SIZE + exclusive + shared
+
+
 @pytest.mark.skipif('not _PY3K')
 @pytest.mark.parametrize('x, b', [
     ('"abc"', b'abc'),
@@ -1196,3 +1374,37 @@ def test_sp(x, sp):
         x = K(x)
 
     assert x._sp() == sp
+
+
+def test_p_compile_exec(q):
+    h = q('.p.compile"import math\\nmath.hypot(a, b)"')
+    assert q('.p.exec', h, q('`a`b!3 4f')) == 5.0
+    assert q('.p.exec', h, q('`a`b!5 12f')) == 13.0
+    q('.p.free', h)
+    with pytest.raises(kerr):
+        q('.p.exec', h, None)
+
+
+def test_p_exec_nested_scopes(q):
+    h = q('.p.compile"f = lambda i: i * n\\n[f(i) + n for i in range(k)]"')
+    assert list(q('.p.exec', h, q('`n`k!2 3'))) == [2, 4, 6]
+    assert 'f' not in sys.modules['__main__'].__dict__
+    q('.p.free', h)
+
+
+def test_p_exec_own_globals(q):
+    import pyq
+    h = q('.p.compile"y = [x * i for i in range(3)]"')
+    g = {'x': 5}
+    pyq._p_exec(h, q('::'), g)
+    assert g['y'] == [0, 5, 10]
+    assert pyq._p_exec(q('.p.compile"x + a"'), q('(1#`a)!1#1'), g) == 6
+    assert 'a' not in g
+    q('.p.free', h)
+
+
+def test_p_exec_globals(q):
+    h = q('.p.compile"p_exec_test = 42"')
+    assert q('(::)~', q('.p.exec', h, None))
+    assert sys.modules['__main__'].p_exec_test == 42
+    q('.p.free', h)
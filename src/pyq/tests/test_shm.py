@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+
+import os
+
+import pytest
+
+from pyq import q, shm
+
+
+@pytest.fixture
+def root(tmpdir, monkeypatch):
+    monkeypatch.setattr(shm, 'ROOT', tmpdir.strpath)
+    return tmpdir
+
+
+@pytest.mark.parametrize('code', [
+    '42',
+    '`a`b',
+    '1 2 3f',
+    '`a`b!(1 2;"xy")',
+    '([]a:til 5;b:5?`3;c:5?1f;d:string til 5)',
+    '([a:1 2]b:`x`y;c:("ab";"cd"))',
+    '0#([]a:`long$())',
+])
+def test_roundtrip(root, code):
+    x = q(code)
+    name = shm.put(x)
+    try:
+        assert shm.get(name) == x
+    finally:
+        shm.unlink(name)
+    assert not root.listdir()
+
+
+def test_name(root):
+    name = shm.put(q('til 3'), 'test')
+    assert name == 'test'
+    assert os.path.isdir(shm.path('test'))
+    with pytest.raises(OSError):
+        shm.put(q('til 3'), 'test')
+    assert shm.get('test') == [0, 1, 2]
+    shm.unlink('test')
+
+
+def test_get_after_unlink(root):
+    name = shm.put(q('([]a:til 10)'))
+    t = shm.get(name)
+    shm.unlink(name)
+    assert t.a == list(range(10))
@@ -0,0 +1,62 @@
+from __future__ import absolute_import
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 5) or not hasattr(os, 'fork'),
+    reason="requires Python 3.5 and fork")
+
+
+@pytest.fixture
+def zygote(tmpdir):
+    path = tmpdir.join('zygote.sock').strpath
+    p = subprocess.Popen(['pyq', '-m', 'pyq.zygote', '-p', 'json', path])
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.1)
+    else:
+        p.kill()
+        pytest.fail("zygote did not start")
+    yield path
+    p.terminate()
+    p.wait()
+
+
+def test_run_code(zygote, tmpdir):
+    from pyq import zygote as z
+    out = tmpdir.join('out')
+    with out.open('w') as f:
+        status = z.run(zygote, ['-c', 'import sys; from pyq import q; '
+                                'print(q.til(3)); sys.exit(int(q("2+3")))'],
+                       stdout=f)
+    assert status == 5
+    assert out.read() == '0 1 2\n'
+
+
+def test_run_script(zygote, tmpdir):
+    from pyq import zygote as z
+    script = tmpdir.join('job.py')
+    script.write("import os, sys\n"
+                 "print(os.getcwd(), os.environ['JOB'], *sys.argv[1:])\n")
+    out = tmpdir.join('out')
+    env = dict(os.environ, JOB='x')
+    with out.open('w') as f:
+        status = z.run(zygote, [script.strpath, 'a', 'b'], env=env,
+                       cwd=tmpdir.strpath, stdout=f)
+    assert status == 0
+    assert out.read() == '%s x a b\n' % tmpdir.strpath
+
+
+def test_run_error(zygote, tmpdir):
+    from pyq import zygote as z
+    err = tmpdir.join('err')
+    with err.open('w') as f:
+        status = z.run(zygote, ['-c', '1/0'], stderr=f)
+    assert status == 1
+    assert 'ZeroDivisionError' in err.read()
@@ -0,0 +1,293 @@
+"""Fork pre-initialized pyq workers on request
+
+Starting pyq means starting q, initializing Python and importing pyq.
+A zygote does this once and then forks a ready worker for every job it
+is asked to run:
+
+    $ pyq -m pyq.zygote -p numpy -p mymodule /tmp/pyq.sock &
+    $ pyq-fork /tmp/pyq.sock job.py arg1 arg2
+    $ pyq-fork /tmp/pyq.sock -c 'from pyq import q; print(q.til(3))'
+    $ pyq-fork /tmp/pyq.sock -m mypackage.job
+
+pyq-fork sends its command line, working directory, environment and
+standard streams (using SCM_RIGHTS) over the Unix socket, forwards
+SIGINT, SIGTERM and SIGHUP to the worker and exits with its status.
+
+Workers share the memory of the zygote copy-on-write, including
+everything that was loaded into q before the zygote started serving.
+The zygote must not use q's secondary threads (-s): only the thread
+that calls fork() exists in the worker.
+
+This module does not import pyq at the top level, so that pyq-fork can
+load it without starting q.  Requires Python 3.5 or later.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import array
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+__all__ = ['serve', 'run']
+
+_HEADER = struct.Struct('<I')
+_NFDS = 3  # stdin, stdout and stderr
+_FORWARD_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+
+
+def run(path, argv, cwd=None, env=None, stdin=None, stdout=None,
+        stderr=None):
+    """Run argv in a worker forked by the zygote at path
+
+    argv is a Python command line without the interpreter: a script
+    and its arguments, ['-c', code, ...] or ['-m', module, ...].  The
+    streams default to those of the calling process.  Returns the exit
+    status of the worker, or 128 + n if it was killed by signal n.
+    """
+    request = {
+        'argv': list(argv),
+        'cwd': os.getcwd() if cwd is None else cwd,
+        'env': dict(os.environ if env is None else env),
+    }
+    payload = json.dumps(request).encode()
+    fds = [_fileno(s, i) for i, s in enumerate((stdin, stdout, stderr))]
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendmsg([_HEADER.pack(len(payload)) + payload],
+                     [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                       array.array('i', fds))])
+        reply = sock.makefile('rb')
+        pid = json.loads(reply.readline().decode())['pid']
+        handlers = {}
+        try:
+            for signum in _FORWARD_SIGNALS:
+                handlers[signum] = signal.signal(
+                    signum, lambda signum, frame: os.kill(pid, signum))
+        except ValueError:
+            pass  # not in the main thread
+        try:
+            line = reply.readline()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        if not line:
+            raise RuntimeError("zygote closed the connection")
+        return json.loads(line.decode())['status']
+    finally:
+        sock.close()
+
+
+def serve(path, preload=()):
+    """Import the preload modules and serve fork requests on path
+
+    Runs until interrupted.  Must be called from q's main thread with
+    Python in control, for example, with pyq -m pyq.zygote.
+    """
+    import importlib
+    for name in preload:
+        importlib.import_module(name)
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(64)
+    # SIGCHLD wakes up select() through this pipe.
+    rfd, wfd = os.pipe()
+    for fd in (rfd, wfd):
+        os.set_blocking(fd, False)
+    old_wakeup_fd = signal.set_wakeup_fd(wfd)
+    old_handler = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    workers = {}  # pid -> connection waiting for the exit status
+    try:
+        while True:
+            ready = select.select([listener, rfd], [], [])[0]
+            if rfd in ready:
+                try:
+                    while os.read(rfd, 4096):
+                        pass
+                except OSError:
+                    pass
+                _reap(workers)
+            if listener in ready:
+                conn = listener.accept()[0]
+                try:
+                    pid = _fork(conn, listener, workers, (rfd, wfd))
+                except Exception as e:
+                    print("pyq.zygote: %s" % e, file=sys.stderr)
+                    conn.close()
+                else:
+                    workers[pid] = conn
+    finally:
+        signal.signal(signal.SIGCHLD, old_handler)
+        signal.set_wakeup_fd(old_wakeup_fd)
+        os.close(rfd)
+        os.close(wfd)
+        listener.close()
+        for conn in workers.values():
+            conn.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _fileno(stream, default):
+    if stream is None:
+        return default
+    if isinstance(stream, int):
+        return stream
+    return stream.fileno()
+
+
+def _recv_request(conn):
+    fds = array.array('i')
+    msg, ancdata, _, _ = conn.recvmsg(
+        4096, socket.CMSG_SPACE(_NFDS * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    if len(fds) != _NFDS:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError("expected %d file descriptors, got %d" %
+                         (_NFDS, len(fds)))
+    if len(msg) < _HEADER.size:
+        raise ValueError("truncated request")
+    n, = _HEADER.unpack_from(msg)
+    data = msg[_HEADER.size:]
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ValueError("truncated request")
+        data += chunk
+    return list(fds), json.loads(data.decode())
+
+
+def _send(conn, **kwds):
+    conn.sendall(json.dumps(kwds).encode() + b'\n')
+
+
+def _fork(conn, listener, workers, pipe):
+    fds, request = _recv_request(conn)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            listener.close()
+            for c in workers.values():
+                c.close()
+            conn.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.set_wakeup_fd(-1)
+            for fd in pipe:
+                os.close(fd)
+            status = _worker(fds, request)
+        except BaseException:
+            status = 1
+            try:
+                traceback.print_exc()
+                sys.stderr.flush()
+            except BaseException:
+                pass
+        os._exit(status)
+    for fd in fds:
+        os.close(fd)
+    _send(conn, pid=pid)
+    return pid
+
+
+def _worker(fds, request):
+    import runpy
+    from . import q
+
+    os.setsid()
+    for i, fd in enumerate(fds):
+        if fd != i:
+            os.dup2(fd, i)
+            os.close(fd)
+    if int(q('\\p')):
+        q('\\p 0')  # the port belongs to the zygote
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    argv = request['argv']
+    status = 0
+    try:
+        if argv[:1] == ['-c']:
+            sys.argv = ['-c'] + argv[2:]
+            code = compile(argv[1], '<string>', 'exec')
+            exec(code, {'__name__': '__main__'})
+        elif argv[:1] == ['-m']:
+            sys.argv = argv[1:]
+            runpy.run_module(argv[1], run_name='__main__', alter_sys=True)
+        else:
+            sys.argv = argv
+            sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+            runpy.run_path(argv[0], run_name='__main__')
+    except SystemExit as e:
+        status = _exit_status(e.code)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    return status
+
+
+def _exit_status(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _reap(workers):
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError:
+            return
+        if pid == 0:
+            return
+        conn = workers.pop(pid, None)
+        if conn is None:
+            continue
+        if os.WIFSIGNALED(status):
+            status = 128 + os.WTERMSIG(status)
+        else:
+            status = os.WEXITSTATUS(status)
+        try:
+            _send(conn, status=status)
+        except OSError:
+            pass  # pyq-fork went away
+        conn.close()
+
+
+def main(args=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='pyq -m pyq.zygote',
+        description="Serve requests from pyq-fork on a Unix socket")
+    parser.add_argument('-p', '--preload', action='append', default=[],
+                        metavar='MODULE', help="module to import up front")
+    parser.add_argument('path', help="path of the Unix socket")
+    args = parser.parse_args(args)
+    try:
+        serve(args.path, args.preload)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()